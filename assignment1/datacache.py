@@ -0,0 +1,192 @@
+"""Dataset loading shared by the tasks, with a binary columnar cache.
+
+The source file (Excel, or CSV/text with an optional file of headers) is parsed once and converted into a cache
+directory holding one .npy file per column and a manifest (column names and dtypes, description of the source files).
+Later loads map the .npy files into memory (read-only) and build the DataFrame on them without parsing or copying.
+The cache is rebuilt when a source file changes: the modification time and size are checked first and, if they
+differ, the SHA-256 hash of the contents (so that a file touched or copied again unchanged keeps its cache)."""
+
+import numpy as np
+import pandas as pd
+import hashlib
+import json
+import logging
+import os
+import shutil
+
+logger = logging.getLogger(__name__)
+
+CACHE_VERSION = 2
+MANIFEST = 'manifest.json'
+
+
+def file_hash(fname, block_size=2**20):
+    digest = hashlib.sha256()
+    with open(fname, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+
+    return digest.hexdigest()
+
+
+def describe_source(fname, hash_contents=True):
+    """Identification of a source file (its contents hash is computed only if hash_contents)"""
+
+    stat = os.stat(fname)
+    description = dict(path=os.path.abspath(fname), size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+    if hash_contents:
+        description['sha256'] = file_hash(fname)
+
+    return description
+
+
+def read_headers(fname):
+    """Read column names, one per line, stripping 3 initial characters (row number + closing bracket + optional
+    whitespace)"""
+
+    with open(fname) as f:
+        return [line.rstrip('\r\n')[3:] for line in f if line.strip()]
+
+
+def read_source(data_file, data_headers=None):
+    """Parse a dataset: an Excel file (.xls/.xlsx) or a CSV file (with the column names in the first line or, if
+    data_headers is given, in that file)"""
+
+    if os.path.splitext(data_file)[1].lower() in ('.xls', '.xlsx'):
+        return pd.read_excel(data_file)
+
+    if data_headers is not None:
+        return pd.read_csv(data_file, names=read_headers(data_headers))
+
+    return pd.read_csv(data_file)
+
+
+def _write_manifest(directory, manifest):
+    with open(os.path.join(directory, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=1)
+
+
+def _sources_unchanged(directory, manifest, sources):
+    """Check the source files against the manifest of a cache (updating the modification times in it when only they
+    changed)"""
+
+    if [entry['path'] for entry in manifest['sources']] != [os.path.abspath(fname) for fname in sources]:
+        return False
+
+    touched = False
+    for entry, fname in zip(manifest['sources'], sources):
+        current = describe_source(fname, hash_contents=False)
+        if (current['size'], current['mtime_ns']) == (entry['size'], entry['mtime_ns']):
+            continue
+        if current['size'] != entry['size'] or file_hash(fname) != entry['sha256']:
+            return False
+
+        entry['mtime_ns'] = current['mtime_ns']
+        touched = True
+
+    if touched:
+        _write_manifest(directory, manifest)
+
+    return True
+
+
+def _write_cache(df, directory, sources):
+    """Store a DataFrame as one .npy file per column and a manifest (written to a temporary directory first, then
+    renamed, so that a cache directory is always complete)"""
+
+    tmp_directory = directory + '.tmp'
+    shutil.rmtree(tmp_directory, ignore_errors=True)
+    os.makedirs(tmp_directory)
+
+    columns = []
+    for i, (name, column) in enumerate(df.items()):
+        values = column.to_numpy()
+        entry = dict(name=name, dtype=str(column.dtype), file=f'col_{i}.npy')
+
+        if values.dtype == object:
+            # fixed-width strings can be mapped into memory; missing values are stored as a separate mask
+            nulls = column.isna().to_numpy()
+            if nulls.any():
+                entry['nulls'] = f'col_{i}_nulls.npy'
+                np.save(os.path.join(tmp_directory, entry['nulls']), nulls)
+            values = np.where(nulls, '', values).astype(str)
+
+        np.save(os.path.join(tmp_directory, entry['file']), values, allow_pickle=False)
+        columns.append(entry)
+
+    manifest = dict(version=CACHE_VERSION, n_rows=len(df), columns=columns,
+                    sources=[describe_source(fname) for fname in sources])
+    _write_manifest(tmp_directory, manifest)
+
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(tmp_directory, directory)
+
+
+def _read_manifest(directory):
+    try:
+        with open(os.path.join(directory, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    return manifest if manifest.get('version') == CACHE_VERSION else None
+
+
+def _map_cache(directory, manifest):
+    """DataFrame on memory-mapped (read-only) columns of a cache directory"""
+
+    data = {}
+    for column in manifest['columns']:
+        values = np.load(os.path.join(directory, column['file']), mmap_mode='r')
+        if values.dtype.kind == 'U':
+            values = values.astype(object)     # strings are copied into objects
+            if 'nulls' in column:
+                values[np.load(os.path.join(directory, column['nulls']))] = np.nan
+            values = pd.array(values, dtype=column['dtype'])
+        data[column['name']] = values
+
+    return pd.DataFrame(data, copy=False)
+
+
+def load_cached(data_file, data_headers=None, cache_directory=None):
+    """Load a dataset (see read_source) through the columnar cache.
+
+    Parameters
+    ----------
+    data_file       :   str
+        source data file
+    data_headers    :   str
+        file with the column names (for a CSV/text source without a header line)
+    cache_directory :   str
+        directory of the caches (default: '.datacache' next to the data file); a cache is kept in a subdirectory named
+        after the data file
+    """
+
+    sources = [data_file] + ([data_headers] if data_headers is not None else [])
+    cache_directory = cache_directory or os.path.join(os.path.dirname(os.path.abspath(data_file)), '.datacache')
+    directory = os.path.join(cache_directory, os.path.basename(data_file))
+
+    manifest = _read_manifest(directory)
+    if manifest is not None and _sources_unchanged(directory, manifest, sources):
+        logger.debug("Loading %s from cache: %s", data_file, directory)
+        return _map_cache(directory, manifest)
+
+    logger.info("Parsing %s (cache %s)", data_file, 'outdated' if manifest is not None else 'not found')
+    df = read_source(data_file, data_headers)
+    os.makedirs(cache_directory, exist_ok=True)
+    _write_cache(df, directory, sources)
+
+    return _map_cache(directory, _read_manifest(directory))
+
+
+def load_dataset(section):
+    """Load the dataset described by a configuration section ([Data] or [RegressionData]).
+
+    Keys: data_file, data_headers (optional), cache_directory (optional, see load_cached) and use_cache (optional,
+    'no' - parse the source on every load)."""
+
+    data_headers = section.get('data_headers')
+    if not section.getboolean('use_cache', fallback=True):
+        return read_source(section['data_file'], data_headers)
+
+    return load_cached(section['data_file'], data_headers, cache_directory=section.get('cache_directory'))
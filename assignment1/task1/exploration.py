@@ -0,0 +1,168 @@
+"""Exploration plots of the regression data drawn from aggregates (histograms and 2-D densities), so that the time and
+memory used by matplotlib do not depend on the number of samples (matplotlib is imported on first use)"""
+
+import numpy as np
+
+
+def _chunks(columns, chunk_rows):
+    """Blocks [chunk_rows, n_columns] of a list of equally long columns (arrays, Series or memory maps) or of a chunked
+    source - an object with the number of columns as its length and a method blocks(chunk_rows) generating the blocks
+    (e.g. leastsquares.CSVColumns)"""
+
+    if hasattr(columns, 'blocks'):
+        yield from columns.blocks(chunk_rows)
+        return
+
+    n_rows = len(columns[0])
+    for start in range(0, n_rows, chunk_rows):
+        yield np.column_stack([np.asarray(column[start:start + chunk_rows], dtype=float) for column in columns])
+
+
+def column_ranges(columns, chunk_rows=2**16):
+    """Minimum and maximum of each column (ignoring NaNs), computed in one pass (columns: see _chunks)"""
+
+    lo = np.full(len(columns), np.inf)
+    hi = np.full(len(columns), -np.inf)
+    for block in _chunks(columns, chunk_rows):
+        with np.errstate(invalid='ignore'):
+            lo = np.fmin(lo, np.nanmin(block, axis=0, initial=np.inf))
+            hi = np.fmax(hi, np.nanmax(block, axis=0, initial=-np.inf))
+
+    empty = lo > hi
+    lo[empty], hi[empty] = 0., 1.
+    flat = lo == hi    # as in np.histogram
+    lo[flat], hi[flat] = lo[flat] - 0.5, hi[flat] + 0.5
+
+    return lo, hi
+
+
+def _bin_indices(block, edges):
+    """Bin of each value of a block [n, n_columns] given per-column equal-width edges [n_columns, bins + 1] (values
+    outside the edges and NaNs: -1); the last bin includes its right edge, as in np.histogram"""
+
+    bins = edges.shape[1] - 1
+    lo, hi = edges[:, 0], edges[:, -1]
+    with np.errstate(invalid='ignore'):
+        inside = (block >= lo) & (block <= hi)
+        idx = np.where(inside, (block - lo) * (bins / (hi - lo)), -1).astype(np.intp)
+    idx[idx == bins] = bins - 1
+
+    # correct rounding at the bin edges (the computed index may be off by one)
+    cols = np.broadcast_to(np.arange(block.shape[1]), block.shape)
+    valid = idx >= 0
+    left = edges[cols[valid], idx[valid]]
+    right = edges[cols[valid], idx[valid] + 1]
+    values = block[valid]
+    idx[valid] -= values < left
+    idx[valid] += (values >= right) & (idx[valid] < bins - 1)
+
+    return idx
+
+
+def histograms(columns, bins=10, ranges=None, chunk_rows=2**16):
+    """Histograms of all the columns, computed from one pass over the data (or two, if the ranges are not given).
+
+    Parameters
+    ----------
+    columns     :   list
+        equally long columns (arrays, Series or memory maps) or a chunked source (see _chunks)
+    bins        :   int
+        number of equal-width bins per column
+    ranges      :   tuple
+        minimum and maximum of each column (see column_ranges)
+    chunk_rows  :   int
+        number of rows binned at once
+
+    Returns
+    -------
+    counts [n_columns, bins] and bin edges [n_columns, bins + 1]
+    """
+
+    lo, hi = ranges if ranges is not None else column_ranges(columns, chunk_rows)
+    edges = lo[:, np.newaxis] + (hi - lo)[:, np.newaxis] * np.linspace(0, 1, bins + 1)
+    edges[:, -1] = hi     # lo + (hi - lo) may round below the maximum, which would then fall outside the last bin
+
+    counts = np.zeros(len(columns) * bins, dtype=np.int64)
+    for block in _chunks(columns, chunk_rows):
+        idx = _bin_indices(block, edges)
+        flat = (idx + np.arange(len(columns)) * bins)[idx >= 0]
+        counts += np.bincount(flat, minlength=len(counts))
+
+    return counts.reshape(len(columns), bins), edges
+
+
+def densities(columns, target, bins=(50, 50), ranges=None, chunk_rows=2**16):
+    """2-D histograms (density images) of each column against the target, computed in one pass over the data (or
+    two, if the ranges are not given).
+
+    Parameters
+    ----------
+    columns     :   list
+        equally long columns (arrays, Series or memory maps) or a chunked source (see _chunks)
+    target      :   array-like
+        target variable (same length as the columns); None - the target is the last of the columns
+    bins        :   tuple
+        number of bins of the columns and of the target
+    ranges      :   tuple
+        minimum and maximum of each column and of the target, as the last one (see column_ranges)
+    chunk_rows  :   int
+        number of rows binned at once
+
+    Returns
+    -------
+    counts [n_columns, bins[0], bins[1]], edges of the columns [n_columns, bins[0] + 1] and of the target [bins[1] + 1]
+    """
+
+    if target is not None:
+        columns = list(columns) + [target]
+
+    lo, hi = ranges if ranges is not None else column_ranges(columns, chunk_rows)
+    n, (bins_x, bins_y) = len(columns) - 1, bins
+    edges_x = lo[:n, np.newaxis] + (hi - lo)[:n, np.newaxis] * np.linspace(0, 1, bins_x + 1)
+    edges_y = lo[n] + (hi[n] - lo[n]) * np.linspace(0, 1, bins_y + 1)
+    edges_x[:, -1], edges_y[-1] = hi[:n], hi[n]     # exact upper edges (see histograms)
+
+    counts = np.zeros(n * bins_x * bins_y, dtype=np.int64)
+    for block in _chunks(columns, chunk_rows):
+        idx_x = _bin_indices(block[:, :n], edges_x)
+        idx_y = _bin_indices(block[:, n:], edges_y[np.newaxis])
+        valid = (idx_x >= 0) & (idx_y >= 0)
+        flat = (np.arange(n) * bins_x * bins_y + idx_x * bins_y + idx_y)[valid]
+        counts += np.bincount(flat, minlength=len(counts))
+
+    return counts.reshape(n, bins_x, bins_y), edges_x, edges_y
+
+
+def plot_histograms(counts, edges, names, colors=None, n_cols=3, figsize=(8, 6)):
+    """Plot precomputed histograms in a grid (one panel per variable)"""
+
+    import matplotlib.pyplot as plt
+
+    n_rows = len(names) // n_cols + (1 if len(names) % n_cols else 0)
+    fig, axes = plt.subplots(n_rows, n_cols, figsize=figsize, squeeze=False)
+    for i, name in enumerate(names):
+        ax = axes[i // n_cols, i % n_cols]
+        ax.stairs(counts[i], edges[i], fill=True, color=colors[i] if colors is not None else 'darkblue')
+        ax.set_xlabel(name)
+    fig.tight_layout()
+    plt.show()
+
+
+def plot_densities(counts, edges_x, edges_y, names, target_name, figsize=(12, 6)):
+    """Plot precomputed density images of the variables (x axis) against the target (y axis), in 2 rows"""
+
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import LogNorm
+
+    n = len(names)
+    fig, axes = plt.subplots(2, n // 2 + n % 2, figsize=figsize, squeeze=False)
+    for i, name in enumerate(names):
+        ax = axes[i % 2, i // 2]
+        image = np.ma.masked_equal(counts[i].T, 0)    # empty bins are not coloured
+        ax.pcolormesh(edges_x[i], edges_y, image, cmap='Blues', norm=LogNorm(vmin=1, vmax=max(image.max(), 1)))
+        ax.grid(color='lightgray')
+        ax.set_xlabel(name)
+        if not i // 2:
+            ax.set_ylabel(target_name)
+    fig.tight_layout()
+    plt.show()
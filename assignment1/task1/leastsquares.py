@@ -0,0 +1,300 @@
+"""Streaming linear least squares - the model is fitted from sufficient statistics accumulated over chunks of data"""
+
+import numpy as np
+import pandas as pd
+import io
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+def trim_names(columns):
+    """Trim variable names to the first occurrence of an opening bracket (e.g. 'Cement (kg in a m^3 mixture)')"""
+
+    return [key[:key.find('(')] if '(' in key else key for key in columns]
+
+
+class StreamingLeastSquares(object):
+    """Linear regression fitted by least squares from data given in chunks (update), possibly by several processes
+    (merge).
+
+    With method='qr', the triangular factor R of the QR decomposition of [1, X, y] is updated with each chunk
+    (numerically stable; the data is never squared). With method='normal', X^T X and X^T y are accumulated and the
+    normal equations are solved. In both cases, the memory used does not depend on the number of samples. The total
+    sum of squares of the target (for R^2) is accumulated with the pairwise update of the mean and of the sum of
+    squared deviations."""
+
+    def __init__(self, n_inputs, fit_intercept=True, method='qr'):
+        """Initialise the accumulator.
+
+        Parameters
+        ----------
+        n_inputs        :   int
+            number of input variables
+        fit_intercept   :   bool
+            if True, the model includes an intercept
+        method          :   str
+            'qr' (QR updates) or 'normal' (normal equations)
+        """
+
+        if method not in ('qr', 'normal'):
+            raise ValueError(f"Unknown least squares method: {method} (expected 'qr' or 'normal')")
+
+        self.n_inputs = n_inputs
+        self.fit_intercept = fit_intercept
+        self.method = method
+
+        n_cols = n_inputs + int(fit_intercept) + 1    # design matrix columns and the target
+        self.r = np.zeros((0, n_cols))                  # QR method: triangular factor of [1, X, y]
+        self.gram = np.zeros((n_cols, n_cols))          # normal equations: [1, X, y]^T [1, X, y]
+
+        self.n_samples = 0
+        self.y_mean = 0.
+        self.y_m2 = 0.      # sum of squared deviations of the target from its mean
+
+        self.coef_ = None
+        self.intercept_ = 0.
+        self.rss_ = None
+
+    def _design(self, x, y):
+        x = np.asarray(x, dtype=float).reshape(len(x), self.n_inputs)
+        columns = [x, np.asarray(y, dtype=float).reshape(-1, 1)]
+        if self.fit_intercept:
+            columns.insert(0, np.ones((len(x), 1)))
+
+        return np.hstack(columns)
+
+    def update(self, x, y):
+        """Add a chunk of samples (inputs x: [n, n_inputs], target y: [n])"""
+
+        if not len(x):
+            return self
+
+        z = self._design(x, y)
+        if self.method == 'qr':
+            self.r = np.linalg.qr(np.vstack([self.r, z]), mode='r')
+        else:
+            self.gram += z.T @ z
+
+        y = z[:, -1]
+        self._add_moments(len(y), y.mean(), ((y - y.mean()) ** 2).sum())
+
+        return self
+
+    def _add_moments(self, n, mean, m2):
+        total = self.n_samples + n
+        delta = mean - self.y_mean
+
+        self.y_m2 += m2 + delta ** 2 * self.n_samples * n / total
+        self.y_mean += delta * n / total
+        self.n_samples = total
+
+    def merge(self, other):
+        """Add the statistics accumulated by another instance (e.g. in another process)"""
+
+        if (other.n_inputs, other.fit_intercept, other.method) != (self.n_inputs, self.fit_intercept, self.method):
+            raise ValueError("Cannot merge least squares accumulators with different settings")
+
+        if not other.n_samples:
+            return self
+
+        if self.method == 'qr':
+            self.r = np.linalg.qr(np.vstack([self.r, other.r]), mode='r')
+        else:
+            self.gram += other.gram
+        self._add_moments(other.n_samples, other.y_mean, other.y_m2)
+
+        return self
+
+    def solve(self):
+        """Compute the coefficients from the accumulated statistics"""
+
+        if not self.n_samples:
+            raise RuntimeError("No samples to fit the model to")
+
+        if self.method == 'qr':
+            r = np.zeros((self.r.shape[1], self.r.shape[1]))    # fewer samples than columns: R has fewer rows
+            r[:len(self.r)] = self.r
+            r_xx, r_xy, r_yy = r[:-1, :-1], r[:-1, -1], r[-1, -1]
+            beta = np.linalg.lstsq(r_xx, r_xy, rcond=None)[0]
+            self.rss_ = float(((r_xy - r_xx @ beta) ** 2).sum() + r_yy ** 2)
+        else:
+            g_xx, g_xy, g_yy = self.gram[:-1, :-1], self.gram[:-1, -1], self.gram[-1, -1]
+            beta = np.linalg.lstsq(g_xx, g_xy, rcond=None)[0]
+            self.rss_ = float(max(g_yy - 2 * beta @ g_xy + beta @ g_xx @ beta, 0.))
+
+        if self.fit_intercept:
+            self.intercept_, self.coef_ = float(beta[0]), beta[1:]
+        else:
+            self.intercept_, self.coef_ = 0., beta
+
+        return self
+
+    @property
+    def r2_(self):
+        """Coefficient of determination of the fitted model on the accumulated samples"""
+
+        return 1 - self.rss_ / self.y_m2 if self.y_m2 else 1.
+
+    def predict(self, x):
+        return np.asarray(x, dtype=float) @ self.coef_ + self.intercept_
+
+
+def _csv_blocks(fname, start, stop, block_size):
+    """Read the byte range [start, stop) of a text file in blocks of about block_size bytes, each ending at a line end
+    (the range should start at a line beginning)"""
+
+    with open(fname, 'rb') as f:
+        f.seek(start)
+        position = start
+
+        while position < stop:
+            block = f.read(min(block_size, stop - position))
+            position += len(block)
+            if position < stop or not block.endswith(b'\n'):
+                rest = f.readline()     # complete the last line
+                block += rest
+                position += len(rest)
+            if not block:
+                break
+
+            yield block
+
+
+def _byte_ranges(fname, n_parts):
+    """Split a CSV file (after the header line) into byte ranges starting at line beginnings"""
+
+    size = os.path.getsize(fname)
+    with open(fname, 'rb') as f:
+        f.readline()
+        bounds = [f.tell()]
+
+        for i in range(1, n_parts):
+            f.seek(max(bounds[-1], size * i // n_parts))
+            f.readline()
+            bounds.append(min(f.tell(), size))
+
+    bounds.append(size)
+
+    return [(start, stop) for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+
+def _fit_range(fname, start, stop, names, input_names, target_name, block_size, fit_intercept, method,
+               read_csv_kwargs):
+    """Accumulate the least squares statistics of a byte range of a CSV file"""
+
+    model = StreamingLeastSquares(len(input_names), fit_intercept=fit_intercept, method=method)
+
+    for block in _csv_blocks(fname, start, stop, block_size):
+        chunk = pd.read_csv(io.BytesIO(block), header=None, names=names, **read_csv_kwargs)
+        model.update(chunk[input_names].to_numpy(dtype=float), chunk[target_name].to_numpy(dtype=float))
+
+    return model
+
+
+def read_header(fname, rename=trim_names, target_column=-1, **read_csv_kwargs):
+    """Read the column names of a CSV file; return all the (renamed) names, the input names and the target name"""
+
+    names = list(pd.read_csv(fname, nrows=0, **read_csv_kwargs).keys())
+    if rename is not None:
+        names = rename(names)
+
+    target_name = names[target_column]
+    input_names = [name for name in names if name != target_name]
+
+    return names, input_names, target_name
+
+
+class CSVColumns(object):
+    """Columns of a CSV file read in chunks on every pass over them - a chunked source for the exploration functions
+    (see exploration), so that a file larger than memory is never loaded at once"""
+
+    def __init__(self, fname, columns, rename=trim_names, **read_csv_kwargs):
+        """Select the columns.
+
+        Parameters
+        ----------
+        fname           :   str
+            CSV file with a header line
+        columns         :   list
+            (renamed) names of the columns to read, in the order of the blocks
+        rename          :   callable
+            function renaming the columns (as in read_header)
+        read_csv_kwargs :
+            passed to pandas.read_csv (e.g. 'sep')
+        """
+
+        self.fname = fname
+        self.names = read_header(fname, rename=rename, **read_csv_kwargs)[0]
+        self.columns = list(columns)
+        self.read_csv_kwargs = read_csv_kwargs
+
+    def __len__(self):
+        return len(self.columns)
+
+    def _read(self, **kwargs):
+        return pd.read_csv(self.fname, header=0, names=self.names, usecols=self.columns, **self.read_csv_kwargs,
+                           **kwargs)
+
+    def head(self, n=5):
+        """First n rows of the columns (a DataFrame)"""
+
+        return self._read(nrows=n)[self.columns]
+
+    def blocks(self, chunk_rows):
+        """Blocks [chunk_rows, n_columns] of the column values (floats)"""
+
+        for chunk in self._read(chunksize=chunk_rows):
+            yield chunk[self.columns].to_numpy(dtype=float)
+
+
+def fit_csv(fname, target_column=-1, rename=trim_names, block_size=2**24, n_jobs=None, fit_intercept=True,
+            method='qr', **read_csv_kwargs):
+    """Fit a linear regression to a CSV file of any size, reading it in blocks.
+
+    Parameters
+    ----------
+    fname           :   str
+        CSV file with a header line
+    target_column   :   int
+        index of the target variable column
+    rename          :   callable
+        function renaming the columns (e.g. trim_names; None - keep the names)
+    block_size      :   int
+        number of bytes parsed at once (per process)
+    n_jobs          :   int
+        if given, the file is split into that many byte ranges fitted in parallel processes, then merged
+    fit_intercept   :   bool
+        if True, the model includes an intercept
+    method          :   str
+        'qr' or 'normal' (see StreamingLeastSquares)
+    read_csv_kwargs :
+        passed to pandas.read_csv (e.g. 'sep')
+
+    Returns
+    -------
+    the fitted model (StreamingLeastSquares), names of the input variables and the name of the target variable
+    """
+
+    names, input_names, target_name = read_header(fname, rename=rename, target_column=target_column,
+                                                  **read_csv_kwargs)
+    ranges = _byte_ranges(fname, n_jobs or 1)
+    args = (names, input_names, target_name, block_size, fit_intercept, method, read_csv_kwargs)
+    logger.info("Fitting linear regression of '%s' to %s (%d parts)", target_name, fname, len(ranges))
+
+    model = StreamingLeastSquares(len(input_names), fit_intercept=fit_intercept, method=method)
+    if n_jobs is None:
+        for start, stop in ranges:
+            model.merge(_fit_range(fname, start, stop, *args))
+
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            futures = [pool.submit(_fit_range, fname, start, stop, *args) for start, stop in ranges]
+            for future in futures:
+                model.merge(future.result())
+
+    logger.info("Accumulated %d samples", model.n_samples)
+
+    return model.solve(), input_names, target_name
@@ -0,0 +1,141 @@
+"""Closed-form cross-validation of linear (ridge) regression.
+
+For a penalised least squares fit with hat matrix H = B B^T and residuals e, the residuals of a test fold S predicted
+by the model fitted without S are exactly (I - H_SS)^-1 e_S = e_S + B_S (I - B_S^T B_S)^-1 B_S^T e_S (Woodbury
+identity), so no model is refitted: leave-one-out residuals are e_i / (1 - h_ii) and a K-fold costs one small
+[p, p] solve per fold. With the singular value decomposition X_c = U S V^T of the centred inputs, B = [1/sqrt(n),
+U diag(s / sqrt(s^2 + alpha))] for any ridge penalty alpha (the intercept is not penalised), so a whole path of
+alphas is cross-validated from one decomposition (alpha = 0 - ordinary least squares)."""
+
+import numpy as np
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def kfold_indices(n_samples, n_splits, random_state=0):
+    """Test indices of shuffled K-fold splits (None - leave-one-out)"""
+
+    if n_splits is None:
+        return None
+
+    if not 2 <= n_splits <= n_samples:
+        raise ValueError(f"Number of folds must be between 2 and the number of samples ({n_samples}), got {n_splits}")
+
+    return np.array_split(np.random.default_rng(random_state).permutation(n_samples), n_splits)
+
+
+class LinearDecomposition(object):
+    """Singular value decomposition of the (centred) inputs of a linear regression, giving the fitted coefficients
+    and the closed-form cross-validation residuals for any ridge penalty"""
+
+    def __init__(self, x, y, fit_intercept=True, rcond=1e-12):
+        """Decompose the inputs.
+
+        Parameters
+        ----------
+        x               :   array-like
+            inputs [n, p]
+        y               :   array-like
+            target [n]
+        fit_intercept   :   bool
+            if True, the model includes an (unpenalised) intercept
+        rcond           :   float
+            singular values below rcond * the largest one are treated as zero (rank-deficient inputs)
+        """
+
+        x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.fit_intercept = fit_intercept
+
+        self.x_mean = x.mean(axis=0) if fit_intercept else np.zeros(x.shape[1])
+        self.y_mean = self.y.mean() if fit_intercept else 0.
+
+        self.u, self.s, vt = np.linalg.svd(x - self.x_mean, full_matrices=False)
+        self.v = vt.T
+        self.rank = int((self.s > rcond * self.s.max()).sum()) if len(self.s) else 0
+        self.u, self.s, self.v = self.u[:, :self.rank], self.s[:self.rank], self.v[:, :self.rank]
+        self.uty = self.u.T @ (self.y - self.y_mean)
+
+    def __len__(self):
+        return len(self.y)
+
+    def _shrinkage(self, alpha):
+        return self.s ** 2 / (self.s ** 2 + alpha)
+
+    def coefficients(self, alpha=0.):
+        """Coefficients and intercept of the model fitted with ridge penalty alpha"""
+
+        coef = self.v @ (self._shrinkage(alpha) / self.s * self.uty)
+        return coef, self.y_mean - self.x_mean @ coef
+
+    def residuals(self, alpha=0.):
+        return self.y - self.y_mean - self.u @ (self._shrinkage(alpha) * self.uty)
+
+    def _hat_factor(self, alpha):
+        """B such that the hat matrix is B B^T"""
+
+        b = self.u * np.sqrt(self._shrinkage(alpha))
+        if self.fit_intercept:
+            b = np.column_stack([np.full(len(self), 1 / np.sqrt(len(self))), b])
+
+        return b
+
+    def cv_residuals(self, alpha=0., folds=None):
+        """Residuals of each sample predicted by the model fitted without its fold (folds: list of test indices;
+        None - leave-one-out)"""
+
+        e = self.residuals(alpha)
+        b = self._hat_factor(alpha)
+
+        if folds is None:
+            h = (b ** 2).sum(axis=1)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return e / (1 - h)     # h = 1: the sample determines its own fit (infinite residual)
+
+        cv_e = np.empty_like(e)
+        identity = np.eye(b.shape[1])
+        for test_idx in folds:
+            b_s, e_s = b[test_idx], e[test_idx]
+            cv_e[test_idx] = e_s + b_s @ np.linalg.solve(identity - b_s.T @ b_s, b_s.T @ e_s)
+
+        return cv_e
+
+
+def cross_validate_linear(x, y, alphas=(0.,), n_splits=None, random_state=0, fit_intercept=True):
+    """Cross-validate linear regression (for each ridge penalty in alphas) without refitting.
+
+    Parameters
+    ----------
+    x               :   array-like
+        inputs [n, p]
+    y               :   array-like
+        target [n]
+    alphas          :   sequence
+        ridge penalties (0 - ordinary least squares)
+    n_splits        :   int
+        number of shuffled K-fold splits (None - leave-one-out)
+    random_state    :   int
+        seed of the fold shuffling
+    fit_intercept   :   bool
+        if True, the model includes an (unpenalised) intercept
+
+    Returns
+    -------
+    dictionary with the alphas, cross-validated mean squared error and R^2 for each alpha, the best alpha (lowest
+    error) and the coefficients and intercept of the model fitted to all the data with it
+    """
+
+    decomposition = LinearDecomposition(x, y, fit_intercept=fit_intercept)
+    folds = kfold_indices(len(decomposition), n_splits, random_state)
+    tss = ((decomposition.y - decomposition.y.mean()) ** 2).sum()
+
+    mse = np.array([np.mean(decomposition.cv_residuals(alpha, folds) ** 2) for alpha in alphas])
+    r2 = 1 - mse * len(decomposition) / tss
+    best = int(np.nanargmin(mse))
+    coef, intercept = decomposition.coefficients(alphas[best])
+    logger.debug("Cross-validated %d alphas on %d samples (rank %d)", len(alphas), len(decomposition),
+                 decomposition.rank)
+
+    return dict(alphas=np.asarray(alphas, dtype=float), mse=mse, r2=r2, best_alpha=alphas[best], coef=coef,
+                intercept=intercept)
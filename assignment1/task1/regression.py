@@ -1,8 +1,14 @@
 import configparser
-import pandas as pd
-from sklearn.linear_model import LinearRegression
 import logging
-import matplotlib.pyplot as plt
+import os
+import sys
+
+import exploration
+import leastsquares
+import linearcv
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import datacache
 
 # read the configuration file
 config = configparser.ConfigParser()
@@ -12,49 +18,68 @@ config.read("config.ini")
 logger = logging.getLogger(__name__)
 logger.setLevel(level=config['Logging']['level'])
 
-# load data dataset
 data_fname = config['RegressionData']['data_file']
-logger.info(f"Loading data from file: {data_fname}")
-df_input = pd.read_excel(data_fname)
+target_column = int(config['RegressionData']['target_column'])
+method = config['RegressionData'].get('method', 'qr')
+
+if data_fname.endswith('.csv'):
+    # a CSV file of any size is never loaded into memory: the exploration passes read it in chunks and the model is
+    # fitted from sufficient statistics accumulated over its blocks (optionally by several processes)
+    _, input_vars, target_var = leastsquares.read_header(data_fname, target_column=target_column)
+    data = leastsquares.CSVColumns(data_fname, input_vars + [target_var])
+    print(data.head())
+
+else:
+    # load data dataset
+    logger.info("Loading data from file: %s", data_fname)
+    df_input = datacache.load_dataset(config['RegressionData'])
+
+    # trim the variable names to the first occurrence of an opening bracket
+    df_input.columns = leastsquares.trim_names(df_input.keys())
+    logger.info("Loading completed. Data shape: %s", df_input.shape)
+    print(df_input.head())
 
-# trim the variable names to the first occurrence of an opening bracket
-df_input.rename(columns={key: key[:key.find('(')] for key in df_input.keys()}, inplace=True)
-logger.info(f"Loading completed. Data shape: {df_input.shape}")
-print(df_input.head())
+    # split dataset into input and target
+    target_var = df_input.keys()[target_column]
+    df_target = df_input.loc[:, target_var]
+    df_input.drop(target_var, axis=1, inplace=True)
 
-# split dataset into input and target
-target_var = df_input.keys()[int(config['RegressionData']['target_column'])]
-df_target = df_input.loc[:, target_var]
-df_input.drop(target_var, axis=1, inplace=True)
+    input_vars = list(df_input.keys())
+    data = [df_input[var].to_numpy() for var in input_vars] + [df_target.to_numpy()]
 
-input_vars = list(df_input.keys())
 n = len(input_vars)
 
-nt = n+1
-fig, axes = plt.subplots(nt//3 + (1 if nt%3 else 0), 3, figsize=(8, 6))
-for i, input_var in enumerate(input_vars):
-    ax = axes[i//3, i%3]
-    ax.hist(df_input.loc[:, input_var], color='darkblue', lw=1)
-    ax.set_xlabel(input_var)
-axes[-1, n%3].hist(df_target, color='crimson')
-fig.tight_layout()
-plt.show()
-
-
-fig, axes = plt.subplots(2, n//2 + n%2, figsize=(12, 6))
-for i, input_var in enumerate(input_vars):
-    ax = axes[i%2, i//2]
-    ax.plot(df_input.loc[:, input_var], '.', color='darkblue', alpha=0.3)
-    ax.grid(color='lightgray')
-    ax.set_xlabel(input_var)
-    if not i//2:
-        ax.set_ylabel(target_var)
-fig.tight_layout()
-plt.show()
-
-
-# fit data
-fitter = LinearRegression()
+# exploration plots drawn from aggregates: all the histograms and the density images of the inputs against the target
+# are each computed in one pass over the data, so plotting does not depend on the number of samples
+ranges = exploration.column_ranges(data)
+
+counts, edges = exploration.histograms(data, ranges=ranges)
+exploration.plot_histograms(counts, edges, input_vars + [target_var], colors=n*['darkblue'] + ['crimson'])
+
+counts, edges_x, edges_y = exploration.densities(data, None, ranges=ranges)
+exploration.plot_densities(counts, edges_x, edges_y, input_vars, target_var)
+
+
+# fit data (from sufficient statistics accumulated in chunks)
 logger.debug("Fitting the data...")
-fitter.fit(df_input, df_target)
-logger.info(f"Fitting completed. Score: {fitter.score(df_input, df_target):.3f}")
+if data_fname.endswith('.csv'):
+    fitter, _, _ = leastsquares.fit_csv(data_fname, target_column=target_column,
+                                        n_jobs=config.getint('RegressionData', 'n_jobs', fallback=None),
+                                        method=method)
+else:
+    fitter = leastsquares.StreamingLeastSquares(n, method=method).update(df_input, df_target).solve()
+logger.info("Fitting completed. Score: %.3f", fitter.r2_)
+
+# cross-validation (closed form - no refitting) of the linear regression and of ridge regression over a grid of alphas;
+# it decomposes all the inputs at once, so it is done only for data loaded into memory
+if data_fname.endswith('.csv'):
+    logger.info("Cross-validation skipped for the CSV file %s (the closed form needs the data in memory)", data_fname)
+else:
+    n_splits = config['CrossValidation'].get('n_splits', 'loo')
+    cv_name = 'leave-one-out' if n_splits == 'loo' else f'{n_splits}-fold'
+    alphas = [float(alpha) for alpha in config['CrossValidation'].get('alphas', '0').split(',')]
+    cv_stats = linearcv.cross_validate_linear(df_input, df_target, alphas=alphas,
+                                              n_splits=None if n_splits == 'loo' else int(n_splits))
+    for alpha, mse, r2 in zip(cv_stats['alphas'], cv_stats['mse'], cv_stats['r2']):
+        logger.info("Cross-validation (%s, alpha: %g): MSE %.4g, R^2 %.3f", cv_name, alpha, mse, r2)
+    logger.info("Best alpha: %g", cv_stats['best_alpha'])
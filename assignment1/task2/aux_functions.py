@@ -1,99 +1,160 @@
+"""Cross-validation, metrics and parameter tuning of the decision tree.
+
+Plotting (see plotting) and the scikit-learn comparisons (see sklearn_comparison) live in separate modules; heavy
+dependencies (matplotlib, scikit-learn, tqdm) are imported only when they are used."""
+
 import numpy as np
-import matplotlib.pyplot as plt
 import logging
-from sklearn.preprocessing import label_binarize
-from sklearn import metrics
-from sklearn.model_selection import KFold, GridSearchCV
-from tqdm import tqdm
 import itertools
+from concurrent.futures import ProcessPoolExecutor
 
 from decisiontree import Node
+from sharedframe import SharedFrame
+from plotting import calculate_roc, plot_roc_curve, calculate_and_plot_roc
 
 
 logger = logging.getLogger(__name__)
 
+_SKLEARN_COMPARISON = ('cross_validate_sklearn', 'make_grid_searcher')
+
+# the ROC helpers (from plotting) and the scikit-learn comparisons are re-exported for the existing callers
+__all__ = ['kfold_splits', 'calculate_metrics', 'run_parallel', 'run_folds_parallel', 'cross_validate_tree',
+           'tune_params', 'tune_tree_params', 'calculate_roc', 'plot_roc_curve', 'calculate_and_plot_roc',
+           *_SKLEARN_COMPARISON]
+
+
+def __getattr__(name):
+    """The scikit-learn comparisons are still available from this module (sklearn_comparison is imported on first
+    access, which also avoids a circular import)"""
+
+    if name in _SKLEARN_COMPARISON:
+        import sklearn_comparison
+        return getattr(sklearn_comparison, name)
 
-def calculate_roc(labels_true, labels_pred):
-    # Note: the ROC/ROC AUC calculation and plotting has been prepared based on:
-    # https://scikit-learn.org/stable/auto_examples/model_selection/plot_roc.html
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-    classes = list(set(labels_true))
-    labels_true_bin = label_binarize(labels_true, classes=classes)
-    labels_pred = np.array(labels_pred)
 
-    fpr = dict()
-    tpr = dict()
-    roc_auc = dict()
-    for i in range(len(classes)):
-        c = classes[i]
-        y_score = labels_pred == c
-        fpr[c], tpr[c], _ = metrics.roc_curve(labels_true_bin[:, i], y_score)
-        roc_auc[c] = metrics.auc(fpr[c], tpr[c])
+def _progress(iterable):
+    """Progress bar over an iterable (tqdm is imported on first use)"""
+    from tqdm import tqdm
 
-    return fpr, tpr, roc_auc
+    return tqdm(iterable)
 
 
-def plot_roc_curve(fpr: dict, tpr: dict, roc_auc: dict, title=None):
-    fig, ax = plt.subplots()
-    ax.plot([0, 1], [0, 1], 'k--', lw=1.5)
-    for c in fpr.keys():
-        ax.plot(fpr[c], tpr[c], label=f"class {c} (ROC AUC: {roc_auc[c]:.2g})", lw=2.5)
-    ax.legend(fancybox=True, framealpha=0.5)
-    ax.set_xlabel("False Positive Rate")
-    ax.set_ylabel("True Positive Rate")
-    ax.set_aspect('equal')
-    ax.set_title(title or "ROC curves", fontsize=14)
-    plt.grid()
-    plt.show()
+def kfold_splits(n_samples, n_splits, random_state=0):
+    """Generate (train positions, test positions) of shuffled K-fold cross-validation.
 
+    The folds are the same as those of sklearn.model_selection.KFold(n_splits, shuffle=True,
+    random_state=random_state), without importing scikit-learn."""
 
-def calculate_and_plot_roc(*args, **kwargs):
-    title = kwargs.pop('title', None)
-    plot_roc_curve(*calculate_roc(*args, **kwargs), title=title)
+    if not 2 <= n_splits <= n_samples:
+        raise ValueError(f"Number of folds should be between 2 and the number of samples ({n_samples}); "
+                         f"got {n_splits}")
+
+    shuffled = np.arange(n_samples)
+    np.random.RandomState(random_state).shuffle(shuffled)
+
+    fold_sizes = np.full(n_splits, n_samples // n_splits)
+    fold_sizes[:n_samples % n_splits] += 1
+
+    start = 0
+    for fold_size in fold_sizes:
+        test_mask = np.zeros(n_samples, dtype=bool)
+        test_mask[shuffled[start:start + fold_size]] = True
+
+        yield np.flatnonzero(~test_mask), np.flatnonzero(test_mask)
+        start += fold_size
 
 
 def calculate_metrics(labels_true, labels_pred):
-    cm = metrics.confusion_matrix(labels_true, labels_pred)
+    # confusion matrix over the sorted labels present in either list (as sklearn.metrics.confusion_matrix)
+    n = len(labels_true)
+    labels, codes = np.unique(np.concatenate([np.asarray(labels_true), np.asarray(labels_pred)]), return_inverse=True)
+    cm = np.bincount(codes[:n] * len(labels) + codes[n:], minlength=len(labels) ** 2).reshape(len(labels), len(labels))
+
     accuracy = cm.trace() / cm.sum()
-    f1_score = metrics.f1_score(labels_true, labels_pred, average='micro')
+    f1_score = accuracy     # micro-averaged F1 score of single-label predictions is the accuracy
 
     return dict(cm=cm, accuracy=accuracy, f1_score=f1_score)
 
 
-def cross_validate_tree(n_splits, data, **kwargs):
-    logger.info(f"Decision tree learning and testing with {n_splits}-fold cross validation")
+_fold_frame = None     # data frame attached to shared memory in a cross-validation worker process
+_fold_shm = None
+
+
+def _init_fold_worker(spec):
+    global _fold_shm, _fold_frame
+    _fold_shm, _fold_frame = SharedFrame.attach(spec)
+
+
+def _run_fold(fold_func, args):
+    return fold_func(_fold_frame, *args)
+
+
+def _tree_fold(data, model, train_idx, test_idx, kwargs):
+    return model.train_and_test(data, train_idx, test_idx, **kwargs)
+
+
+def run_parallel(data, func, args_list, n_jobs, mp_context=None):
+    """Run tasks in a process pool over a shared-memory copy of the data and return their results (in order).
+
+    Each worker attaches to the shared data once; func(data, *args) is called in a worker for each element of
+    args_list (func should be a module-level function; it is given the shared data frame). mp_context (a
+    multiprocessing context) sets how the workers are started - when called from a thread of a multi-threaded
+    process, use 'forkserver' or 'spawn', as forking such a process may deadlock."""
+
+    with SharedFrame(data) as shared:
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=mp_context, initializer=_init_fold_worker,
+                                 initargs=(shared.spec,)) as pool:
+            futures = [pool.submit(_run_fold, func, args) for args in args_list]
+
+            results = []
+            for i, future in enumerate(_progress(futures)):
+                results.append(future.result())
+                logger.debug("Task %d finished", i)
 
-    splitter = KFold(n_splits=n_splits, shuffle=True, random_state=0)
+    return results
+
+
+def run_folds_parallel(data, fold_func, fold_args, n_jobs, mp_context=None):
+    """Run cross-validation folds in a process pool over a shared-memory copy of the data (see run_parallel);
+    fold_func should return true and predicted labels of the fold. The labels are concatenated in fold order."""
 
     test_labels_true = []
     test_labels_pred = []
 
-    for i, (train_idx, test_idx) in tqdm(enumerate(splitter.split(data))):
-        logger.info(f"Cross-validation round {i} with {len(train_idx)} train samples and {len(test_idx)} test samples")
-        logger.debug(f"Test indices: {test_idx}")
-
-        true_i, pred_i = Node.train_and_test(data, train_idx, test_idx, **kwargs)
+    for true_i, pred_i in run_parallel(data, fold_func, fold_args, n_jobs, mp_context=mp_context):
         test_labels_true.extend(true_i)
         test_labels_pred.extend(pred_i)
 
-    calculate_and_plot_roc(test_labels_true, test_labels_pred, title="ROC curves for wine data classification")
-    return calculate_metrics(test_labels_true, test_labels_pred)
+    return test_labels_true, test_labels_pred
 
 
-def cross_validate_sklearn(estimator, n_splits, data_x, data_y):
-    splitter = KFold(n_splits=n_splits, shuffle=True, random_state=0)
+def cross_validate_tree(n_splits, data, n_jobs=None, model=Node, plot_roc=True, mp_context=None, **kwargs):
+    logger.info("Decision tree learning and testing with %d-fold cross validation", n_splits)
 
-    test_labels_true = []
-    test_labels_pred = []
+    splits = kfold_splits(len(data), n_splits)
 
-    for i, (train_idx, test_idx) in enumerate(splitter.split(data_x)):
-        logger.debug(f"Cross-validation round {i} with {len(train_idx)} train samples and {len(test_idx)} test samples")
-        logger.debug(f"Test indices: {test_idx}")
+    if n_jobs is not None:
+        folds = [(model, train_idx, test_idx, kwargs) for train_idx, test_idx in splits]
+        test_labels_true, test_labels_pred = run_folds_parallel(data, _tree_fold, folds, n_jobs,
+                                                                mp_context=mp_context)
 
-        test_labels_true.extend(data_y[test_idx])
-        test_labels_pred.extend(estimator.fit(data_x.loc[train_idx], data_y[train_idx]).predict(data_x.loc[test_idx]))
+    else:
+        test_labels_true = []
+        test_labels_pred = []
 
-    calculate_and_plot_roc(test_labels_true, test_labels_pred, title="ROC curves for wine data classification")
+        for i, (train_idx, test_idx) in _progress(enumerate(splits)):
+            logger.info("Cross-validation round %d with %d train samples and %d test samples", i, len(train_idx),
+                        len(test_idx))
+            logger.debug("Test indices: %s", test_idx)
+
+            true_i, pred_i = model.train_and_test(data, train_idx, test_idx, **kwargs)
+            test_labels_true.extend(true_i)
+            test_labels_pred.extend(pred_i)
+
+    if plot_roc:
+        calculate_and_plot_roc(test_labels_true, test_labels_pred, title="ROC curves for wine data classification")
     return calculate_metrics(test_labels_true, test_labels_pred)
 
 
@@ -104,7 +165,7 @@ def tune_params(func, params, func_args=(), func_kwargs=None, scoring_metrics='m
     params_keys = params.keys()
     params_prod = itertools.product(*params.values())
 
-    for params_i in tqdm(params_prod):
+    for params_i in _progress(params_prod):
         params_i_dict = dict(zip(params_keys, params_i))
         xv = func(*func_args, **func_kwargs, **params_i_dict)
         params_i_dict.update(xv if isinstance(xv, dict) else {'metrics': xv})
@@ -114,10 +175,39 @@ def tune_params(func, params, func_args=(), func_kwargs=None, scoring_metrics='m
     return results, best_result
 
 
-def make_grid_searcher(data_x, data_y, n_splits=10):
-    def wrapper(estimator, params):
-        gscv = GridSearchCV(estimator, params, cv=n_splits)
-        res = gscv.fit(data_x, data_y)
-        res_stats = cross_validate_sklearn(res.best_estimator_, n_splits=n_splits, data_x=data_x, data_y=data_y)
-        return res.best_params_, res_stats
-    return wrapper
+def tune_tree_params(n_splits, data, max_depth=range(3, 10), min_points=range(1, 5), target_column=0,
+                     scoring_metrics='metrics', **kwargs):
+    """Tune max_depth and min_points of the decision tree with cross-validation, training one tree per fold.
+
+    In each fold, the tree is grown once to the largest max_depth. A tree grown to a smaller depth is a prefix of it,
+    so predictions for every (max_depth, min_points) pair are obtained by truncating and pruning the compiled tree
+    at prediction time, without modifying or regrowing it. The results have the same form as those of
+    tune_params(cross_validate_tree, ...) (without the ROC plots)."""
+
+    logger.info("Tuning decision tree with %d-fold cross validation (one tree per fold)", n_splits)
+
+    test_labels_true = []
+    test_labels_pred = {(d, m): [] for d in max_depth for m in min_points}
+
+    for i, (train_idx, test_idx) in _progress(enumerate(kfold_splits(len(data), n_splits))):
+        logger.info("Cross-validation round %d with %d train samples and %d test samples", i, len(train_idx),
+                    len(test_idx))
+
+        tree = Node(data, target_column=target_column, indices=train_idx)
+        tree.learn(max_depth=max(max_depth), **kwargs)
+
+        test_data = data.iloc[test_idx]
+        test_labels_true.extend(test_data[tree.target_attribute].to_list())
+
+        compiled = tree.compile()
+        for d, m in test_labels_pred.keys():
+            test_labels_pred[d, m].extend(compiled.predict(test_data, max_depth=d, min_points=m).tolist())
+
+    results = []
+    for d, m in itertools.product(max_depth, min_points):
+        result = dict(max_depth=d, min_points=m)
+        result.update(calculate_metrics(test_labels_true, test_labels_pred[d, m]))
+        results.append(result)
+
+    best_result = results[int(np.argmax([t[scoring_metrics] for t in results]))]
+    return results, best_result
@@ -0,0 +1,325 @@
+"""Scaling benchmark of the decision tree (run as a script; see --help).
+
+Times Node.learn, Node.prune, Node.predict_classes, aux_functions.cross_validate_tree and aux_functions.tune_params on
+synthetic data of given sizes, records the peak memory of each benchmark (tracemalloc) and saves the results as JSON.
+The cold import time of the core modules is measured in fresh interpreters, which also checks that importing them does
+not load any heavy optional dependency. With --compare, the results are checked against a stored baseline and
+regressions are reported (exit status 1)."""
+
+import argparse
+import copy
+import itertools
+import json
+import logging
+from math import inf
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import aux_functions as aux
+from decisiontree import Node
+
+logger = logging.getLogger(__name__)
+
+BENCHMARKS = ('learn', 'prune', 'predict_classes', 'cross_validate_tree', 'tune_params')
+
+# modules needed for training, prediction and metrics - should import quickly, without any of HEAVY_MODULES
+CORE_MODULES = ('decisiontree', 'aux_functions', 'forest', 'streaming', 'codegen')
+HEAVY_MODULES = ('matplotlib', 'sklearn', 'scipy', 'tqdm', 'coloredlogs')
+
+_IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import {module}
+print(time.perf_counter() - start)
+print(' '.join(name for name in {heavy!r} if name in sys.modules))
+"""
+
+# parameter grids: rows, attributes, classes, depths
+SUITES = {
+    'quick': dict(rows=[10**3, 10**4], attributes=[10], classes=[2, 10], depths=[3, 7]),
+    'default': dict(rows=[10**3, 10**4, 10**5], attributes=[10, 100], classes=[2, 10], depths=[3, 7, 11]),
+    'full': dict(rows=[10**3, 10**4, 10**5, 10**6, 10**7], attributes=[10, 100, 1000], classes=[2, 10, 50],
+                 depths=[3, 7, 11, 15]),
+}
+
+
+def make_data(n_rows, n_attributes, n_classes, seed=0):
+    """Generate a classification data set (class labels in the first column, 'class').
+
+    The attributes are standard normal; the class of a sample is the largest of n_classes random linear combinations
+    of (up to) 5 informative attributes plus noise, so that trees keep finding useful splits as they grow deeper."""
+
+    rng = np.random.default_rng(seed)
+    x = rng.standard_normal((n_rows, n_attributes))
+
+    n_informative = min(n_attributes, 5)
+    weights = rng.standard_normal((n_informative, n_classes))
+    scores = x[:, :n_informative] @ weights + 0.5 * rng.standard_normal((n_rows, n_classes))
+
+    data = pd.DataFrame(x, columns=[f'x{i}' for i in range(n_attributes)])
+    data.insert(0, 'class', np.argmax(scores, axis=1))
+
+    return data
+
+
+def measure(func, repeat=3, setup=None):
+    """Run a function 'repeat' times and once more under tracemalloc; return the run times and the peak memory
+    (bytes).
+
+    If 'setup' is given, it is called (untimed) before each run and its result is passed to the function (e.g. a
+    fresh copy of a tree for a benchmark modifying it)."""
+
+    times = []
+    for _ in range(repeat):
+        args = () if setup is None else (setup(),)
+        start = time.perf_counter()
+        func(*args)
+        times.append(time.perf_counter() - start)
+
+    args = () if setup is None else (setup(),)
+    tracemalloc.start()
+    try:
+        func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return times, peak
+
+
+def run_case(data, benchmark, depth, n_splits=5):
+    """Return a function running a single benchmark on given data (tree depth 'depth') and its setup function (None
+    or a function preparing the argument of each run, see measure)"""
+
+    if benchmark == 'learn':
+        return lambda: Node(data).learn(max_depth=depth), None
+
+    if benchmark in ('prune', 'predict_classes'):
+        tree = Node(data)
+        tree.learn(max_depth=depth)
+        if benchmark == 'prune':
+            # pruning modifies the tree - every run prunes a fresh copy of the trained tree
+            return lambda copied: copied.prune(min_points=2), lambda: copy.deepcopy(tree)
+        return lambda: tree.predict_classes(data), None
+
+    if benchmark == 'cross_validate_tree':
+        return lambda: aux.cross_validate_tree(n_splits, data, max_depth=depth, min_points=2, plot_roc=False), None
+
+    if benchmark == 'tune_params':
+        params = dict(max_depth=[max(depth - 2, 1), depth], min_points=[1, 2])
+        return (lambda: aux.tune_params(aux.cross_validate_tree, params, func_args=(n_splits, data),
+                                        func_kwargs=dict(plot_roc=False), scoring_metrics='accuracy')), None
+
+    raise ValueError(f"Unknown benchmark: {benchmark} (expected one of: {', '.join(BENCHMARKS)})")
+
+
+def run_suite(rows, attributes, classes, depths, benchmarks=BENCHMARKS, repeat=3, seed=0, max_cells=10**8,
+              max_cv_cells=10**6, n_splits=5):
+    """Run the benchmarks for every combination of the parameters.
+
+    Parameters
+    ----------
+    rows            :   list
+        numbers of rows of the data
+    attributes      :   list
+        numbers of input attributes
+    classes         :   list
+        numbers of classes
+    depths          :   list
+        maximal tree depths
+    benchmarks      :   list
+        names of the benchmarks to run (see BENCHMARKS)
+    repeat          :   int
+        number of timed runs of each benchmark
+    seed            :   int
+        seed of the data generator
+    max_cells       :   int
+        data sizes (rows x attributes) above this limit are skipped
+    max_cv_cells    :   int
+        cross-validation and tuning are skipped for data sizes above this limit
+    n_splits        :   int
+        number of cross-validation folds
+
+    Returns
+    -------
+    list of results (dicts with the benchmark parameters, run times and peak memory)
+    """
+
+    results = []
+
+    for n_rows, n_attributes, n_classes in itertools.product(rows, attributes, classes):
+        if n_rows * n_attributes > max_cells:
+            logger.warning("Skipping data of %d rows and %d attributes (above the size limit)", n_rows, n_attributes)
+            continue
+
+        data = make_data(n_rows, n_attributes, n_classes, seed=seed)
+
+        for depth, benchmark in itertools.product(depths, benchmarks):
+            if benchmark in ('cross_validate_tree', 'tune_params') and n_rows * n_attributes > max_cv_cells:
+                continue
+
+            logger.info("Benchmark '%s': %d rows, %d attributes, %d classes, depth %d", benchmark, n_rows, n_attributes,
+                        n_classes, depth)
+            func, setup = run_case(data, benchmark, depth, n_splits=n_splits)
+            times, peak = measure(func, repeat=repeat, setup=setup)
+
+            results.append(dict(benchmark=benchmark, rows=n_rows, attributes=n_attributes, classes=n_classes,
+                                depth=depth, times=times, best=min(times), median=statistics.median(times),
+                                peak_memory=peak))
+
+    return results
+
+
+def measure_imports(modules=CORE_MODULES, repeat=5):
+    """Measure the cold import time of each module in fresh interpreters; return the results (dicts with the run times
+    and the heavy modules loaded by the import)"""
+
+    results = []
+    directory = os.path.dirname(os.path.abspath(__file__))
+
+    for module in modules:
+        times = []
+        for _ in range(repeat):
+            script = _IMPORT_SCRIPT.format(module=module, heavy=HEAVY_MODULES)
+            output = subprocess.run([sys.executable, '-c', script], cwd=directory, capture_output=True, text=True,
+                                    check=True).stdout.split('\n')
+            times.append(float(output[0]))
+            heavy = output[1].split()
+
+        logger.info("Import of '%s': %.3f s (loads %s)", module, min(times), ', '.join(heavy) or "no heavy modules")
+        results.append(dict(module=module, times=times, best=min(times), heavy_modules=heavy))
+
+    return results
+
+
+def compare_imports(results, baseline=(), tolerance=0.1, max_time=None):
+    """Check import results: return the regressions - modules loading heavy dependencies, taking longer than max_time
+    seconds (if given) or slower than in the baseline by more than 'tolerance' (relative)"""
+
+    baseline = {result['module']: result for result in baseline}
+    regressions = []
+
+    for result in results:
+        base = baseline.get(result['module'])
+        if result['heavy_modules']:
+            regressions.append(dict(module=result['module'], metric='heavy_modules', value=result['heavy_modules']))
+        if max_time is not None and result['best'] > max_time:
+            regressions.append(dict(module=result['module'], metric='best', value=result['best'], baseline=max_time))
+        elif base is not None and result['best'] > base['best'] * (1 + tolerance):
+            regressions.append(dict(module=result['module'], metric='best', value=result['best'],
+                                    baseline=base['best']))
+
+    return regressions
+
+
+def _key(result):
+    return tuple(result[name] for name in ('benchmark', 'rows', 'attributes', 'classes', 'depth'))
+
+
+def compare(results, baseline, tolerance=0.1, min_time=1e-3):
+    """Compare results with a baseline; return the regressions - results whose best time or peak memory exceeds the
+    baseline by more than 'tolerance' (relative). Times below 'min_time' seconds are not compared (too noisy)."""
+
+    baseline = {_key(result): result for result in baseline}
+    regressions = []
+
+    for result in results:
+        base = baseline.get(_key(result))
+        if base is None:
+            continue
+
+        for metric in ('best', 'peak_memory'):
+            if metric == 'best' and max(result[metric], base[metric]) < min_time:
+                continue
+            if result[metric] > base[metric] * (1 + tolerance):
+                regressions.append(dict(zip(('benchmark', 'rows', 'attributes', 'classes', 'depth'), _key(result)),
+                                        metric=metric, baseline=base[metric], value=result[metric],
+                                        ratio=result[metric] / base[metric] if base[metric] else inf))
+
+    return regressions
+
+
+def environment():
+    """Describe the environment the benchmark runs in"""
+
+    return dict(python=platform.python_version(), numpy=np.__version__, pandas=pd.__version__,
+                platform=platform.platform(), processor=platform.processor(),
+                date=time.strftime('%Y-%m-%dT%H:%M:%S'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--suite', choices=SUITES, default='quick', help="predefined parameter grid")
+    parser.add_argument('--rows', type=int, nargs='+', help="numbers of rows (overrides the suite)")
+    parser.add_argument('--attributes', type=int, nargs='+', help="numbers of attributes (overrides the suite)")
+    parser.add_argument('--classes', type=int, nargs='+', help="numbers of classes (overrides the suite)")
+    parser.add_argument('--depths', type=int, nargs='+', help="maximal tree depths (overrides the suite)")
+    parser.add_argument('--benchmarks', nargs='+', choices=BENCHMARKS, default=BENCHMARKS)
+    parser.add_argument('--repeat', type=int, default=3, help="number of timed runs of each benchmark")
+    parser.add_argument('--seed', type=int, default=0, help="seed of the data generator")
+    parser.add_argument('--max-cells', type=float, default=1e8, help="skip data larger than rows x attributes")
+    parser.add_argument('--max-cv-cells', type=float, default=1e6,
+                        help="skip cross-validation and tuning for data larger than rows x attributes")
+    parser.add_argument('--output', default='benchmark_results.json', help="JSON file for the results")
+    parser.add_argument('--compare', metavar='BASELINE', help="JSON file with baseline results")
+    parser.add_argument('--tolerance', type=float, default=0.1, help="relative slowdown flagged as a regression")
+    parser.add_argument('--imports', action='store_true', help="also measure import times of the core modules")
+    parser.add_argument('--max-import-time', type=float, help="import time (seconds) flagged as a regression")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(name)s %(levelname)s %(message)s')
+    logging.getLogger('decisiontree').setLevel(logging.WARNING)
+    logging.getLogger('aux_functions').setLevel(logging.WARNING)
+
+    grid = dict(SUITES[args.suite])
+    for name in grid:
+        if getattr(args, name) is not None:
+            grid[name] = getattr(args, name)
+
+    imports = measure_imports(repeat=args.repeat) if args.imports else []
+    results = run_suite(benchmarks=args.benchmarks, repeat=args.repeat, seed=args.seed, max_cells=args.max_cells,
+                        max_cv_cells=args.max_cv_cells, **grid)
+
+    with open(args.output, 'w') as f:
+        json.dump(dict(environment=environment(), grid=grid, results=results, imports=imports), f, indent=2)
+    logger.info("Results of %d benchmarks saved to %s", len(results), args.output)
+
+    baseline = dict(results=[], imports=[])
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline.update(json.load(f))
+
+    regressions = compare(results, baseline['results'], tolerance=args.tolerance)
+    for r in regressions:
+        logger.error("Regression in '%s' (%d rows, %d attributes, %d classes, depth %d): %s %.4g vs baseline %.4g "
+                     "(x%.2f)", r['benchmark'], r['rows'], r['attributes'], r['classes'], r['depth'], r['metric'],
+                     r['value'], r['baseline'], r['ratio'])
+
+    import_regressions = compare_imports(imports, baseline['imports'], tolerance=args.tolerance,
+                                         max_time=args.max_import_time)
+    for r in import_regressions:
+        if r['metric'] == 'heavy_modules':
+            logger.error("Import of '%s' loads heavy modules: %s", r['module'], ', '.join(r['value']))
+        else:
+            logger.error("Regression in import of '%s': %.3f s (limit %.3f s)", r['module'], r['value'], r['baseline'])
+
+    if regressions or import_regressions:
+        return 1
+
+    if args.compare is None:
+        return 0
+
+    logger.info("No regressions against %s (tolerance %.0f%%)", args.compare, 100 * args.tolerance)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
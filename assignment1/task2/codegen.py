@@ -0,0 +1,181 @@
+"""Export of a trained decision tree as standalone Python source code"""
+
+import numpy as np
+import logging
+import types
+
+from compiledtree import CompiledTree
+
+logger = logging.getLogger(__name__)
+
+_INDENT = '    '
+
+
+def _get_compiled(tree):
+    return tree if isinstance(tree, CompiledTree) else tree.compile()
+
+
+def _branches(tree, node):
+    """Conditions on the split feature value 'v' selecting each child of an internal node (as source code)"""
+
+    thresholds = [repr(float(th)) for th in tree.thresholds[node] if np.isfinite(th)]
+    n_ranges = len(thresholds) + 1
+
+    conditions = [f'v <= {thresholds[0]}']
+    conditions += [f'v <= {th}' for th in thresholds[1:]]
+    if tree.n_children[node] > n_ranges:
+        conditions.append(f'v > {thresholds[-1]}')    # the last child holds the missing values
+
+    return conditions
+
+
+def _emit_node(tree, stop, node, depth, lines):
+    indent = _INDENT * depth
+
+    if stop[node]:
+        lines.append(f'{indent}return {tree.labels[node].item()!r}')
+        return
+
+    lines.append(f'{indent}v = x[{tree.feature[node]}]')
+
+    conditions = _branches(tree, node)
+    children = range(tree.first_child[node], tree.first_child[node] + tree.n_children[node])
+
+    for i, (condition, child) in enumerate(zip(conditions, children)):
+        lines.append(f"{indent}{'if' if i == 0 else 'elif'} {condition}:")
+        _emit_node(tree, stop, child, depth + 1, lines)
+
+    lines.append(f'{indent}else:')
+    _emit_node(tree, stop, children[-1], depth + 1, lines)
+
+
+def _emit_batch(tree, stop, lines):
+    """Batch prediction: a boolean mask of the rows reaching each node (breadth-first), then np.select over the masks
+    of the nodes where the routing stops"""
+
+    indent = _INDENT * 2
+    leaves = []
+    masks = {0: 'np.ones(len(X), dtype=bool)'}
+
+    for node in range(len(tree)):
+        if node not in masks:
+            continue    # below a node where the routing stops
+
+        lines.append(f'{indent}m{node} = {masks[node]}')
+        if stop[node]:
+            leaves.append(node)
+            continue
+
+        v = f'X[:, {tree.feature[node]}]'
+        conditions = [condition.replace('v', v) for condition in _branches(tree, node)]
+        first = tree.first_child[node]
+
+        # a row goes to the first child whose condition holds (rows with missing values fail all the comparisons)
+        remaining = f'm{node}'
+        for i, condition in enumerate(conditions):
+            masks[first + i] = f'{remaining} & ({condition})'
+            lines.append(f'{indent}r{node}_{i} = {remaining} & ~({condition})')
+            remaining = f'r{node}_{i}'
+        masks[first + len(conditions)] = remaining
+
+    lines.append(f"{indent}return np.select([{', '.join(f'm{node}' for node in leaves)}], "
+                 f"[{', '.join(repr(tree.labels[node].item()) for node in leaves)}], "
+                 f"default={tree.labels[0].item()!r})")
+
+
+def generate_source(tree, max_depth=None, min_points=None):
+    """Generate source code of a Python module predicting classes with a trained tree.
+
+    The module defines ATTRIBUTES (the order of values in an observation), predict_one(x) - nested if statements
+    using only built-in operations, for a single observation given as a sequence of attribute values - and
+    predict(X) - vectorised prediction for a 2-D NumPy array (NumPy is imported only when it is called).
+
+    Parameters
+    ----------
+    tree            :   Node or CompiledTree
+        the trained tree
+    max_depth       :   int
+        if given, the tree is exported as if it was truncated at that depth (see CompiledTree.predict)
+    min_points      :   int
+        if given, the tree is exported as if it was pruned with that min_points (see Node.prune)
+    """
+
+    tree = _get_compiled(tree)
+    stop = tree._get_stop_mask(max_depth=max_depth, min_points=min_points)
+
+    lines = ['"""Decision tree predictor (generated code, see codegen.generate_source)"""',
+             '',
+             f'ATTRIBUTES = {tree.attributes!r}',
+             '',
+             '',
+             'def predict_one(x):',
+             f'{_INDENT}"""Predict the class of a single observation (sequence of values ordered as ATTRIBUTES)"""',
+             '']
+    _emit_node(tree, stop, 0, 1, lines)
+
+    lines += ['',
+              '',
+              'def predict(X):',
+              f'{_INDENT}"""Predict classes for a 2-D NumPy array of observations (columns ordered as ATTRIBUTES)"""',
+              '',
+              f'{_INDENT}import numpy as np',
+              '',
+              f'{_INDENT}X = np.asarray(X, dtype=float)',
+              f'{_INDENT}with np.errstate(invalid=\'ignore\'):']
+    _emit_batch(tree, stop, lines)
+
+    return '\n'.join(lines) + '\n'
+
+
+def write_module(tree, fname, **kwargs):
+    """Save the generated predictor module (kwargs: see generate_source)"""
+
+    with open(fname, 'w') as f:
+        f.write(generate_source(tree, **kwargs))
+
+
+def load_source(source, name='tree_predictor'):
+    """Create a module from the generated source code"""
+
+    module = types.ModuleType(name)
+    exec(compile(source, f'<{name}>', 'exec'), module.__dict__)
+
+    return module
+
+
+def verify(tree, observations, source=None, **kwargs):
+    """Check that the generated predictor (both predict_one and predict) gives the same predictions as the tree.
+
+    Parameters
+    ----------
+    tree            :   Node or CompiledTree
+        the trained tree
+    observations    :   pandas.DataFrame or np.ndarray
+        observations to predict (for a DataFrame, the columns are selected by the attribute names)
+    source          :   str
+        generated source code to check (if not given, it is generated)
+    kwargs          :
+        max_depth and min_points (as for generate_source)
+
+    Returns
+    -------
+    True if all predictions are identical
+    """
+
+    tree = _get_compiled(tree)
+    module = load_source(source if source is not None else generate_source(tree, **kwargs))
+
+    x = tree._get_array(observations)
+    expected = tree.predict(x, **kwargs)
+
+    single = np.array([module.predict_one(row) for row in x.tolist()])
+    batch = module.predict(x)
+
+    for name, predicted in [('predict_one', single), ('predict', batch)]:
+        mismatches = np.flatnonzero(predicted != expected)
+        if len(mismatches):
+            logger.warning("Generated %s differs from the tree for %d observations (first: row %d, %s instead of %s)",
+                           name, len(mismatches), mismatches[0], predicted[mismatches[0]], expected[mismatches[0]])
+            return False
+
+    return True
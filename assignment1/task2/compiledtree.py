@@ -0,0 +1,191 @@
+"""Flat-array representation of a trained decision tree for vectorised batch prediction"""
+
+import numpy as np
+import pandas as pd
+import json
+import struct
+
+import profiling
+
+# binary file format: header (magic, version, metadata length), JSON metadata, then the node arrays (aligned)
+FILE_MAGIC = b'DTREE\0'
+FILE_VERSION = 1
+FILE_ALIGNMENT = 64
+_HEADER = struct.Struct('<6sHI')
+
+_ARRAYS = ('feature', 'thresholds', 'first_child', 'n_children', 'labels', 'levels', 'n_points', 'min_child_points')
+
+
+class CompiledTree(object):
+    """Decision tree stored as flat arrays (one entry per node, nodes numbered breadth-first).
+
+    The children of a node occupy consecutive entries starting at 'first_child'. A sample at an internal node goes to
+    the child number equal to the count of the node's thresholds lower than the sample's value of the split feature
+    (i.e. to the child whose value range (th[i], th[i+1]] contains the value).
+
+    Every node keeps its number of training samples and the prevalent label, so the tree can be used as if it was
+    truncated at some depth or pruned (see Node.prune) without modifying it."""
+
+    def __init__(self, attributes, feature, thresholds, first_child, n_children, labels, levels, n_points,
+                 min_child_points=None):
+        """Initialise a compiled tree.
+
+        Parameters
+        ----------
+        attributes      :   list
+            names of the input attributes (feature index i refers to attributes[i])
+        feature         :   np.ndarray
+            index of the split feature for each node (-1 for leaves)
+        thresholds      :   np.ndarray
+            split thresholds of each node (shape: [n_nodes, max_thresholds]), padded with inf
+        first_child     :   np.ndarray
+            index of the first child of each node (-1 for leaves)
+        n_children      :   np.ndarray
+            number of children of each node
+        labels          :   np.ndarray
+            class label of each node (for internal nodes - the prevalent label of their samples)
+        levels          :   np.ndarray
+            level of each node (0 for the root)
+        n_points        :   np.ndarray
+            number of training samples in each node
+        min_child_points:   np.ndarray
+            the smallest number of samples among the children of each node (computed if not given)
+        """
+
+        self.attributes = list(attributes)
+        self.feature = np.asarray(feature)
+        self.thresholds = np.asarray(thresholds)
+        self.first_child = np.asarray(first_child)
+        self.n_children = np.asarray(n_children)
+        self.labels = np.asarray(labels)
+        self.levels = np.asarray(levels)
+        self.n_points = np.asarray(n_points)
+
+        if min_child_points is not None:
+            self.min_child_points = np.asarray(min_child_points)
+            return
+
+        # the smallest number of samples among the children of each node (for pruning); in the breadth-first
+        # numbering, the children of consecutive internal nodes form consecutive blocks covering nodes 1, 2, ...
+        self.min_child_points = np.full(len(self.feature), np.iinfo(np.int64).max)
+        internal = np.flatnonzero(self.n_children > 0)
+        if len(internal):
+            self.min_child_points[internal] = np.minimum.reduceat(self.n_points, self.first_child[internal])
+
+    def save(self, fname):
+        """Save the tree in a compact binary file (struct of arrays; see load)."""
+
+        arrays = [np.ascontiguousarray(getattr(self, name)) for name in _ARRAYS]
+
+        layout = []
+        offset = 0
+        for name, array in zip(_ARRAYS, arrays):
+            layout.append(dict(name=name, dtype=array.dtype.str, shape=array.shape, offset=offset))
+            offset += -(-array.nbytes // FILE_ALIGNMENT) * FILE_ALIGNMENT
+
+        meta = json.dumps(dict(attributes=self.attributes, arrays=layout)).encode()
+        data_start = -(-(_HEADER.size + len(meta)) // FILE_ALIGNMENT) * FILE_ALIGNMENT
+
+        with open(fname, 'wb') as f:
+            f.write(_HEADER.pack(FILE_MAGIC, FILE_VERSION, len(meta)))
+            f.write(meta)
+            for array, entry in zip(arrays, layout):
+                f.seek(data_start + entry['offset'])
+                f.write(array.tobytes())
+
+    @classmethod
+    def load(cls, fname, mmap=True):
+        """Load a tree saved with save; with mmap=True, the node arrays are memory-mapped (read-only), so loading
+        takes constant time and processes loading the same file share the memory."""
+
+        with open(fname, 'rb') as f:
+            magic, version, meta_len = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != FILE_MAGIC:
+                raise ValueError(f"File {fname} is not a compiled tree file")
+            if version > FILE_VERSION:
+                raise ValueError(f"Unsupported compiled tree file version ({version}, expected <= {FILE_VERSION})")
+            meta = json.loads(f.read(meta_len))
+
+            data_start = -(-(_HEADER.size + meta_len) // FILE_ALIGNMENT) * FILE_ALIGNMENT
+            arrays = {}
+            for entry in meta['arrays']:
+                shape = tuple(entry['shape'])
+                if mmap and np.prod(shape):
+                    arrays[entry['name']] = np.memmap(fname, dtype=entry['dtype'], mode='r', shape=shape,
+                                                      offset=data_start + entry['offset'])
+                else:
+                    f.seek(data_start + entry['offset'])
+                    arrays[entry['name']] = np.fromfile(f, dtype=entry['dtype'],
+                                                        count=int(np.prod(shape))).reshape(shape)
+
+        return cls(meta['attributes'], **arrays)
+
+    def __len__(self):
+        return len(self.feature)
+
+    def __str__(self):
+        return f"Compiled tree ({len(self)} nodes, {np.count_nonzero(self.feature < 0)} leaves)"
+
+    def _get_array(self, observations):
+        """Convert observations to a 2-D float array with columns ordered as 'attributes'"""
+
+        if isinstance(observations, pd.DataFrame):
+            return observations[self.attributes].to_numpy(dtype=float)
+
+        observations = np.asarray(observations, dtype=float)
+        if observations.ndim != 2 or observations.shape[1] != len(self.attributes):
+            raise ValueError(f"Observations should be a 2-D array with {len(self.attributes)} columns "
+                             f"(got shape {observations.shape})")
+
+        return observations
+
+    def _get_stop_mask(self, max_depth=None, min_points=None):
+        """For each node, True if observations reaching the node stop there"""
+
+        stop = self.feature < 0
+        if max_depth is not None:
+            stop |= self.levels >= max_depth
+        if min_points is not None:
+            stop |= self.min_child_points < min_points
+
+        return stop
+
+    def apply(self, observations, max_depth=None, min_points=None):
+        """Route observations through the tree and return the index of the node each of them ends up at.
+
+        All observations move down the tree together, one level per iteration. If max_depth is given, the tree is
+        treated as if it was truncated at that depth (the routing stops at nodes at level max_depth). If min_points is
+        given, the tree is treated as if it was pruned (the routing stops at nodes with any child having less than
+        min_points samples)."""
+
+        x = self._get_array(observations)
+        stop = self._get_stop_mask(max_depth=max_depth, min_points=min_points)
+
+        with profiling.phase('predict', rows=len(x)):
+            nodes = np.zeros(len(x), dtype=np.intp)
+            active = np.flatnonzero(~stop[nodes])
+
+            while len(active):
+                if profiling.enabled:
+                    profiling.count('routing_iterations')
+                    profiling.count('routing_steps', len(active))
+
+                current = nodes[active]
+                vals = x[active, self.feature[current]]
+
+                which_child = (self.thresholds[current] < vals[:, np.newaxis]).sum(axis=1)
+                which_child[np.isnan(vals)] = self.n_children[current[np.isnan(vals)]] - 1  # missing values go last
+
+                nodes[active] = self.first_child[current] + which_child
+                active = active[~stop[nodes[active]]]
+
+        return nodes
+
+    def predict(self, observations, max_depth=None, min_points=None):
+        """Predict classes for a set of observations (DataFrame or 2-D array).
+
+        Optionally, the tree is truncated at given depth and/or pruned with given min_points on the fly (the nodes at
+        which the routing stops act as leaves labelled with the prevalent class of their samples); the tree itself
+        is not modified."""
+
+        return self.labels[self.apply(observations, max_depth=max_depth, min_points=min_points)]
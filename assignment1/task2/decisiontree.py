@@ -4,27 +4,277 @@ import numpy as np
 import pandas as pd
 from math import inf
 import logging
+import copy
+import heapq
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from splitsearch import (best_threshold_split, best_sorted_split, best_histogram_split, best_multiway_split,
+                         best_multiway_histogram_split, entropy_counts, quantile_edges, quantise)
+from compiledtree import CompiledTree
+import profiling
 
 logger = logging.getLogger(__name__)
 
 
+def _extend(buffer, size, values, copy=False):
+    """Write values after the first 'size' entries (along the last axis) of a buffer and return the buffer - a new one,
+    with the capacity doubled, if the values do not fit in it (or if 'copy' is True)"""
+
+    stop = size + values.shape[-1]
+    dtype = np.result_type(buffer, values)
+
+    if copy or stop > buffer.shape[-1] or dtype != buffer.dtype:
+        grown = np.empty(buffer.shape[:-1] + (max(stop, 2 * size),), dtype=dtype)
+        grown[..., :size] = buffer[..., :size]
+        buffer = grown
+
+    buffer[..., size:stop] = values
+
+    return buffer
+
+
+def _contains_any(index, labels):
+    """Check if any of the labels is present in a pandas index"""
+
+    if index.is_unique:
+        # the hash table of a unique index is built once and cached by pandas
+        return (index.get_indexer(labels) >= 0).any()
+
+    return index.isin(labels).any()
+
+
+class TreeData(object):
+    """Training data shared by all nodes of a tree.
+
+    Holds the data frame, its columns as NumPy arrays and orders of all rows sorted by each column (both cached on first
+    use), the class labels encoded as integer codes and the sample order - an array of row positions. Every node owns
+    a contiguous slice of the sample order, which is partitioned in place between the node's children when the node is
+    split.
+
+    Optionally (see quantise), the input attributes are also stored quantised into bins (histogram training mode).
+
+    Rows appended to the data (see append) are kept in separate data frames, and the arrays are buffers with room for
+    more rows, so that appending costs time proportional to the number of new rows."""
+
+    __slots__ = ('_frames', 'target_attribute', 'input_attributes', 'classes', '_codes', '_n_rows', '_order',
+                 '_n_order', '_columns', '_sorted', 'max_bins', '_bins', 'bin_edges', '_owns_buffers')
+
+    def __init__(self, frame: pd.DataFrame, target_column=0, indices=None, classes=None):
+        self._frames = [frame]
+        self._n_rows = len(frame)
+
+        all_keys = frame.keys().to_list()
+        self.target_attribute = all_keys[target_column]
+        self.input_attributes = [key for key in all_keys if key != self.target_attribute]
+
+        labels = frame[self.target_attribute].to_numpy()
+        if classes is None:
+            self.classes, self._codes = np.unique(labels, return_inverse=True)
+        else:
+            # all class labels known in advance (e.g. the frame holds only a part of the data)
+            self.classes = np.unique(classes)
+            self._codes = np.searchsorted(self.classes, labels)
+        self.order = np.arange(len(frame)) if indices is None else self.positions(indices)
+        self._columns = {}
+        self._sorted = {}
+
+        self.max_bins = None
+        self._bins = None
+        self.bin_edges = None
+
+        self._owns_buffers = True
+
+    def __len__(self):
+        """Number of rows of the data"""
+
+        return self._n_rows
+
+    @property
+    def frame(self):
+        """The data frame (rows appended since the last access are joined to it first)"""
+
+        if len(self._frames) > 1:
+            self._frames = [pd.concat(self._frames)]
+
+        return self._frames[0]
+
+    @property
+    def codes(self):
+        return self._codes[:self._n_rows]
+
+    @property
+    def bins(self):
+        return None if self._bins is None else self._bins[:, :self._n_rows]
+
+    @property
+    def order(self):
+        return self._order[:self._n_order]
+
+    @order.setter
+    def order(self, order):
+        self._order = np.asarray(order)
+        self._n_order = len(self._order)
+
+    def reserve(self, n):
+        """Extend the sample order by n entries (to be filled in by the caller) and return the position of the first
+        one"""
+
+        start = self._n_order
+        self._order = _extend(self._order, start, np.empty(n, dtype=self._order.dtype))
+        self._n_order += n
+
+        return start
+
+    def positions(self, indices):
+        """Translate sample indices (labels of the data frame index) to row positions"""
+
+        if isinstance(indices, (set, frozenset)):
+            indices = list(indices)
+
+        positions = self.frame.index.get_indexer(pd.Index(indices))
+        if (positions < 0).any():
+            raise KeyError("Some of the sample indices are not present in the data")
+
+        return positions
+
+    def column(self, attribute):
+        """Values of an attribute for all rows of the data frame"""
+
+        if attribute not in self._columns:
+            parts = [frame[attribute].to_numpy() for frame in self._frames]
+            self._columns[attribute] = parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+        return self._columns[attribute][:self._n_rows]
+
+    def sorted_positions(self, attribute, positions):
+        """Sort row positions (repetitions allowed) by the attribute value (missing values at the end).
+
+        The order of all rows is computed once per attribute (rows appended later are merged into it, without sorting
+        all rows again); sorting a subset of rows is then a linear-time filtering of that order."""
+
+        values = self.column(attribute)
+        order = self._sorted.get(attribute)
+
+        if order is None:
+            order = np.argsort(values, kind='stable')
+        elif len(order) < self._n_rows:
+            new_order = np.arange(len(order), self._n_rows)
+            new_order = new_order[np.argsort(values[new_order], kind='stable')]
+            # insert after equal values - the same as the stable sort of all rows (missing values stay at the end)
+            order = np.insert(order, np.searchsorted(values[order], values[new_order], side='right'), new_order)
+        self._sorted[attribute] = order
+
+        weights = np.bincount(positions, minlength=self._n_rows)
+        order = order[weights[order] > 0]
+
+        return np.repeat(order, weights[order])
+
+    def append(self, rows: pd.DataFrame):
+        """Append rows to the data and return their positions (the sample order is not changed).
+
+        The rows should have the same columns as the data frame, index labels not present in it and known class
+        labels. The new rows are quantised with the existing bin edges. Only the new rows are processed: the cached
+        columns, class codes and bins are extended in their buffers and the sorted orders of the columns are
+        extended when next used (see sorted_positions)."""
+
+        if rows.keys().to_list() != self._frames[0].keys().to_list():
+            raise ValueError("New rows should have the same columns as the data")
+
+        if any(_contains_any(frame.index, rows.index) for frame in self._frames):
+            raise ValueError("Some of the new sample indices are already present in the data")
+
+        labels = rows[self.target_attribute].to_numpy()
+        codes = np.minimum(np.searchsorted(self.classes, labels), len(self.classes) - 1)
+        if (self.classes[codes] != labels).any():
+            raise ValueError(f"New rows contain unknown class labels: {np.setdiff1d(labels, self.classes)}")
+
+        positions = np.arange(self._n_rows, self._n_rows + len(rows))
+
+        # the buffers (and caches) of a store created with with_order are shared with the original one
+        copy = not self._owns_buffers
+        self._frames = self._frames + [rows]
+        self._codes = _extend(self._codes, self._n_rows, codes, copy=copy)
+        self._columns = {attribute: _extend(column, self._n_rows, rows[attribute].to_numpy(), copy=copy)
+                         for attribute, column in self._columns.items()}
+        self._sorted = dict(self._sorted)
+
+        if self.quantised:
+            bins = [quantise(rows[attribute].to_numpy(dtype=float), edges, missing_bin=self.max_bins)
+                    for attribute, edges in zip(self.input_attributes, self.bin_edges)]
+            self._bins = _extend(self._bins, self._n_rows,
+                                 np.array(bins, dtype=np.uint8).reshape(len(bins), len(rows)), copy=copy)
+
+        self._n_rows += len(rows)
+        self._owns_buffers = True
+
+        return positions
+
+    def with_order(self, order):
+        """Return a copy sharing all the data arrays (and caches), but with a new sample order"""
+
+        store = copy.copy(self)
+        store.order = np.array(order)
+        store._owns_buffers = False
+
+        return store
+
+    @property
+    def quantised(self):
+        return self._bins is not None
+
+    def quantise(self, max_bins=255):
+        """Quantise each input attribute into at most max_bins quantile bins (stored as uint8, one row per attribute;
+        bin number max_bins is reserved for missing values)"""
+
+        if not 1 < max_bins < 256:
+            raise ValueError(f"Number of bins should be between 2 and 255 (got {max_bins})")
+
+        self.max_bins = max_bins
+        self.bin_edges = []
+        self._bins = np.empty((len(self.input_attributes), self._n_rows), dtype=np.uint8)
+
+        for i, attribute in enumerate(self.input_attributes):
+            values = self.column(attribute)
+            self.bin_edges.append(quantile_edges(values[self.order], max_bins=max_bins))
+            self._bins[i] = quantise(values, self.bin_edges[i], missing_bin=max_bins)
+
+    def histogram(self, positions):
+        """Class occurrences in each bin of each input attribute for given samples (shape:
+        [n_attributes, max_bins + 1, n_classes])"""
+
+        n_attr, n_bins, n_cls = len(self.input_attributes), self.max_bins + 1, len(self.classes)
+
+        flat = (np.arange(n_attr)[:, np.newaxis] * n_bins + self.bins[:, positions]) * n_cls + self.codes[positions]
+
+        return np.bincount(flat.ravel(), minlength=n_attr * n_bins * n_cls).reshape(n_attr, n_bins, n_cls)
+
+
 class Node(object):
     """Node - a basic element of a decision tree structure."""
 
+    __slots__ = ('_level', '_terminal', '_class', '_parent', '_target', '_store', '_which_child', '_children',
+                 '_split_attribute', '_split_thresholds', '_start', '_split_pos', '_stop', '_counts', '_n_points',
+                 '_entropy', '_histogram', '_n_checked', '_pending')
+
     def __init__(self, data: pd.DataFrame, target_column=0, level: int=0,
                  indices=None, terminal=False, parent=None, which_child=0):
         """Initialise a tree node.
 
         Parameters
         ----------
-        data            :   pd.DataFrame
-            data frame containing all attributes (including the target attribute) for the training set
+        data            :   pd.DataFrame or TreeData
+            data frame containing all attributes (including the target attribute) for the training set;
+            for a root node, a TreeData instance (used as is, with its sample order) is also accepted, for a non-root
+            node the parent's data frame or TreeData instance
         target_column   :   int
             index of a column containing the target variable
         level           :   int
             node level (0 for a root)
-        indices         :   iterable
-            set of sample indices belonging to the given node (as distributed by the parent)
+        indices         :   iterable or slice
+            sample indices belonging to the given node (as distributed by the parent); for a non-root node,
+            either a subset of the parent's indices remaining to be distributed or a slice of the parent's sample order
         terminal        :   bool
             True if a node should be a leaf (not for further splitting)
         parent          :   Node
@@ -45,9 +295,27 @@ class Node(object):
 
         self._parent = parent
 
-        self._target = target_column if not level else parent.target_column
-        self._validate_data(data, self._target)
-        self._data = data
+        if not level and isinstance(data, TreeData):
+            if indices is not None:
+                raise ValueError("Sample indices are taken from the TreeData sample order (use indices=None)")
+
+            self._target = data.frame.keys().get_loc(data.target_attribute)
+            self._store = data
+            span = slice(0, len(self._store.order))
+        elif not level:
+            self._target = target_column
+            self._validate_data(data, self._target)
+            self._store = TreeData(data, target_column=target_column, indices=indices)
+            span = slice(0, len(self._store.order))
+        else:
+            if data is not parent._store and data is not parent.full_data:
+                raise ValueError("Non-root node must share the data with its parent")
+            if indices is None:
+                raise ValueError("indices=None not allowed for a non-root node (use empty set if necessary)")
+
+            self._target = parent.target_column
+            self._store = parent._store
+            span = indices if isinstance(indices, slice) else parent._claim(indices)
 
         self._which_child = which_child
 
@@ -56,18 +324,16 @@ class Node(object):
         self._split_attribute = None
         self._split_thresholds = []
 
-        if indices is None:
-            if not level:
-                indices = set(data.index)
-            else:
-                raise ValueError("indices=None not allowed for a non-root node (use empty set if necessary)")
-        else:
-            indices = set(indices)
-
-        self._indices_distributed = set()
-        self._indices_remaining = indices
+        # the node samples: order[start:stop]; order[start:split_pos] - distributed among the children
+        self._start = self._split_pos = span.start
+        self._stop = span.stop
+        self._pending = []  # arrays of samples received since the node was laid out in the sample order (see update)
 
-        self._entropy = self.calculate_entropy_labels((self.class_labels.to_list()))
+        self._counts = np.bincount(self._store.codes[self.positions], minlength=len(self._store.classes))
+        self._n_points = int(self._stop - self._start)
+        self._entropy = entropy_counts(self._counts)
+        self._histogram = None
+        self._n_checked = self._n_points  # number of samples when the split was last chosen (see update)
 
     @staticmethod
     def _validate_data(data, target_column):
@@ -96,11 +362,19 @@ class Node(object):
 
     @property
     def full_data(self):
-        return self._data
+        return self._store.frame
 
     @property
     def data(self):
-        return self._data.loc[self.indices]
+        return self._store.frame.iloc[self.positions]
+
+    @property
+    def positions(self):
+        """Row positions (in the full data frame) of the node samples"""
+
+        self._gather()
+
+        return self._store.order[self._start:self._stop]
 
     @property
     def level(self):
@@ -113,21 +387,27 @@ class Node(object):
 
         return 0
 
+    def _get_indices(self, start, stop):
+        return self._store.frame.index[self._store.order[start:stop]]
+
     @property
     def indices_distributed(self):
-        return self._indices_distributed
+        self._gather()
+        return self._get_indices(self._start, self._split_pos)
 
     @property
     def indices_remaining(self):
-        return self._indices_remaining
+        self._gather()
+        return self._get_indices(self._split_pos, self._stop)
 
     @property
     def indices(self):
-        return self._indices_distributed | self._indices_remaining  # set union
+        self._gather()
+        return self._get_indices(self._start, self._stop)
 
     @property
     def resolved(self):
-        return True if (self._terminal or not self._indices_remaining) else False
+        return True if (self._terminal or self._split_pos == self._stop) else False
 
     @property
     def split_thresholds(self):
@@ -145,12 +425,11 @@ class Node(object):
 
     @property
     def target_attribute(self):
-        return self.data.keys().to_list()[self.target_column]
+        return self._store.target_attribute
 
     @property
     def input_attributes(self):
-        all_keys = self.data.keys().to_list()
-        return all_keys[:self.target_column] + all_keys[self.target_column+1:]
+        return self._store.input_attributes[:]
 
     @property
     def target_column(self):
@@ -158,15 +437,47 @@ class Node(object):
 
     @property
     def class_labels(self):
-        return self.data[self.target_attribute]
+        return self.full_data[self.target_attribute].iloc[self.positions]
+
+    @property
+    def label_counts(self):
+        """Number of node samples in each class (classes ordered as in 'classes')"""
+
+        return self._counts
+
+    @property
+    def classes(self):
+        """All class labels present in the training data"""
+
+        return self._store.classes
+
+    @property
+    def prevalent_label(self):
+        return self._store.classes[np.argmax(self._counts)]
+
+    def set_label_counts(self, counts):
+        """Set the class occurrences of a node (for trees grown without the samples in memory, see streaming)."""
+
+        self._counts = np.asarray(counts)
+        self._n_points = int(self._counts.sum())
+        self._entropy = entropy_counts(self._counts)
+
+    @property
+    def histogram(self):
+        """Per-bin class occurrences of the node samples for each input attribute (histogram training mode only)"""
+
+        if self._histogram is None:
+            self._histogram = self._store.histogram(self.positions)
+
+        return self._histogram
 
     @property
     def n_classes(self):
-        return len(set(self.class_labels))
+        return np.count_nonzero(self._counts)
 
     @property
     def n_points(self):
-        return len(self.data)
+        return self._n_points
 
     @property
     def uniform(self):
@@ -212,17 +523,30 @@ class Node(object):
     def children(self):
         return self._children
 
+    def _claim(self, indices):
+        """Move given sample indices to the front of the part of the sample order remaining to be distributed and
+        return the slice they occupy"""
+
+        self._gather()
+        positions = self._store.positions(indices)
+        remaining = self._store.order[self._split_pos:self._stop]
+
+        if not np.isin(positions, remaining).all():
+            raise ValueError("Child indices are not a subset of the parent indices remaining to be distributed)")
+
+        mask = np.isin(remaining, positions)
+        remaining[:] = np.concatenate([remaining[mask], remaining[~mask]])
+
+        return slice(self._split_pos, self._split_pos + np.count_nonzero(mask))
+
     def _add_child(self, child):
         if not isinstance(child, type(self)):
             raise TypeError(f"Child should be of type {type(self)}")
 
-        chis = child.indices
-
-        if not chis.issubset(self._indices_remaining):
+        if child._store is not self._store or child._start != self._split_pos or child._stop > self._stop:
             raise ValueError("Child indices are not a subset of the parent indices remaining to be distributed)")
 
-        self._indices_distributed |= chis   # set union
-        self._indices_remaining -= chis     # set difference
+        self._split_pos = child._stop
         self._children.append(child)
 
     def add_new_child(self, indices):
@@ -230,42 +554,54 @@ class Node(object):
 
         Parameters
         ----------
-        indices     :   iterable
-            indices from the node's samples to be assigned to the child
+        indices     :   iterable or slice
+            indices from the node's samples to be assigned to the child (or a slice of the node's sample order)
         """
 
-        child = self.__class__(self._data, level=self.level+1, indices=indices, parent=self,
+        child = self.__class__(self._store, level=self.level+1, indices=indices, parent=self,
                                which_child=len(self.children))
         self._add_child(child)
 
     def add_final_child(self):
         """Add a child to the node such as the rest of the not yet distributed indices are assigned to the child"""
 
-        self.add_new_child(self.indices_remaining)
+        self.add_new_child(slice(self._split_pos, self._stop))
+
+    def _get_value_ranges(self, attribute, th, positions):
+        """For each sample, find the value range (th[i], th[i+1]] its attribute value falls into
+        (len(th) - 1 if none, e.g. for missing values)"""
+
+        ranges = np.searchsorted(th, self._store.column(attribute)[positions], side='left') - 1
+        ranges[ranges < 0] = len(th) - 1
+
+        return ranges
 
     def _get_split_indices(self, attribute, thresholds):
         """Split node sample indices for given attribute and threshold"""
 
         th = sorted(list(thresholds) + [-inf, inf])
 
-        vals = self.data[attribute]
-
-        all_indices = []
+        positions = self.positions
+        ranges = self._get_value_ranges(attribute, th, positions)
+        index = self.full_data.index
 
-        for i in range(1, len(th)):
-            indices = vals.index[(vals > th[i - 1]) & (vals <= th[i])]
-            all_indices.append(indices)
+        all_indices = [index[positions[ranges == i]] for i in range(len(th) - 1)]
 
         return th, all_indices
 
     def get_split_information_gain(self, attribute, thresholds):
         """Calculate expected information gain after splitting at given attribute with given thresholds"""
 
-        _, all_indices = self._get_split_indices(attribute, thresholds)
-        split_labels = [self.class_labels.loc[indices].to_list() for indices in all_indices]
+        th = sorted(list(thresholds) + [-inf, inf])
+
+        positions = self.positions
+        ranges = self._get_value_ranges(attribute, th, positions)
 
-        n_tot = len(self.data)
-        remainder = sum([(len(labels)/n_tot * self.calculate_entropy_labels(labels)) for labels in split_labels])
+        n_cls = len(self._store.classes)
+        counts = np.bincount(ranges * n_cls + self._store.codes[positions], minlength=len(th) * n_cls)
+        counts = counts.reshape(len(th), n_cls)[:-1]  # samples outside all the ranges do not contribute
+
+        remainder = (counts.sum(axis=1) * entropy_counts(counts)).sum() / self.n_points
 
         return self.entropy() - remainder
 
@@ -275,20 +611,70 @@ class Node(object):
         if attribute == self.target_attribute:
             raise ValueError(f"Cannot split on the target attribute ('{attribute}')")
 
+        self._gather()
         if self.resolved:
             logger.warning("Splitting an already resolved node - existing children will be removed")
             self.undo_split()
 
-        th, all_indices = self._get_split_indices(attribute, thresholds)
+        th = sorted(list(thresholds) + [-inf, inf])
+
+        with profiling.phase('partition', node=self, rows=self._stop - self._split_pos, attribute=attribute):
+            # partition the samples remaining to be distributed in place, in the order of the value ranges
+            remaining = self._store.order[self._split_pos:self._stop]
+            ranges = self._get_value_ranges(attribute, th, remaining)
+            sort_idx = np.argsort(ranges, kind='stable')
+            remaining[:] = remaining[sort_idx]
+            bounds = self._split_pos + np.searchsorted(ranges[sort_idx], np.arange(len(th)))
 
-        for i, indices in enumerate(all_indices):
-            if not len(indices):
-                logger.warning(f"No observations in value range ({th[i]}, {th[i+1]}] for attribute '{attribute}'")
-            self.add_new_child(indices)
+            for i in range(len(th) - 1):
+                if bounds[i] == bounds[i+1]:
+                    logger.warning("No observations in value range (%s, %s] for attribute '%s'",
+                                   th[i], th[i+1], attribute)
+                self.add_new_child(slice(bounds[i], bounds[i+1]))
 
-        if not self.resolved:
-            logger.warning(f"Could not perform full split on attribute {attribute} - possibly missing values")
-            self.add_final_child()
+            if not self.resolved:
+                logger.warning("Could not perform full split on attribute %s - possibly missing values", attribute)
+                self.add_final_child()
+
+            self._split_thresholds = th
+            self._split_attribute = attribute
+
+            if self._histogram is not None:
+                self._distribute_histogram()
+
+    def _distribute_histogram(self):
+        """Compute histograms of the children - the largest child's histogram is obtained by subtracting its siblings'
+        histograms from the parent's one (the parent's histogram is then released)"""
+
+        largest = max(self.children, key=lambda child: child.n_points)
+        remainder = self._histogram.copy()
+
+        for child in self.children:
+            if child is not largest:
+                remainder -= child.histogram
+
+        largest._histogram = remainder
+        self._histogram = None
+
+    def split_from_counts(self, attribute, thresholds, children_counts):
+        """Split a node without samples in memory, given the class occurrences of each child (for trees grown out of
+        core, see streaming)."""
+
+        if self._stop > self._start:
+            raise RuntimeError(f"Node {self.trace()} holds samples in memory - use split_at instead")
+
+        th = sorted(list(thresholds) + [-inf, inf])
+
+        if len(children_counts) != len(th) - 1:
+            raise ValueError(f"Expected class occurrences for {len(th) - 1} children (got {len(children_counts)})")
+
+        if self.children:
+            logger.warning("Splitting an already split node - existing children will be removed")
+            self.undo_split()
+
+        for counts in children_counts:
+            self.add_new_child(slice(self._split_pos, self._split_pos))
+            self.children[-1].set_label_counts(counts)
 
         self._split_thresholds = th
         self._split_attribute = attribute
@@ -296,54 +682,137 @@ class Node(object):
     def undo_split(self):
         """Remove children of a node and make it terminal"""
 
-        logger.debug(f"Undoing split at node {self.trace()}")
+        logger.debug("Undoing split at node %s", self.trace())
         self._children = []
-        self._indices_remaining = self._indices_distributed.copy()
-        self._indices_distributed = set()
+        self._split_pos = self._start
 
-    def choose_split_threshold(self, attribute, n=10):
+    def choose_split_threshold(self, attribute, n=1):
         """Perform search for the best threshold for split at given attribute.
 
-        'n' - granularity of the search (check every n-th threshold candidate)"""
+        All threshold candidates are scored at once from cumulative class counts of the sorted attribute values
+        (or, in the histogram mode, from the node's per-bin class counts - then the candidates are the bin edges).
+        'n' - granularity of the search (check every n-th threshold candidate; not used in the histogram mode)"""
 
-        vals = np.sort(np.array(self.data[attribute]))  # values for the attribute
-        th_cand = 0.5 * (vals[1:] + vals[:-1])  # threshold candidates - consecutive mid-points
-        th_cand = th_cand[::n]  # check every n-th
+        search, args = self._get_threshold_search(attribute, n=n)
+        chosen_gain, chosen_threshold = search(*args)
+        logger.debug("For attribute '%s', best gain is %.2g (at threshold %.3g)", attribute, chosen_gain,
+                     chosen_threshold)
 
-        gains = [self.get_split_information_gain(attribute, [th]) for th in th_cand]
+        return chosen_gain, chosen_threshold
 
-        idx = np.argmax(gains)
+    def choose_split_thresholds(self, attribute, ways=3, n=1):
+        """Perform search for the best split at given attribute into (at most) 'ways' value ranges.
 
-        chosen_gain = gains[idx]
-        chosen_threshold = th_cand[idx]
-        logger.debug(f"For attribute '{attribute}', best gain is {chosen_gain:.2g} "
-                     f"(at threshold {chosen_threshold:.3g})")
+        The optimal partition is found by dynamic programming over cumulative class counts of (at most 255) groups
+        of sorted attribute values (or of the bins, in the histogram mode). Returns the gain and a list of thresholds
+        ready for split_at. For ways=2, equivalent to choose_split_threshold."""
 
-        return chosen_gain, chosen_threshold
+        if ways < 2:
+            raise ValueError(f"Split should be into at least 2 value ranges (got {ways})")
+
+        if ways == 2:
+            chosen_gain, chosen_threshold = self.choose_split_threshold(attribute, n=n)
+            return chosen_gain, [chosen_threshold]
+
+        search, args = self._get_threshold_search(attribute, n=n, ways=ways)
+        chosen_gain, chosen_thresholds = search(*args)
+        logger.debug("For attribute '%s', best gain is %.2g (at thresholds %s)", attribute, chosen_gain,
+                     chosen_thresholds)
+
+        return chosen_gain, chosen_thresholds
+
+    def _get_threshold_search(self, attribute, n=1, ways=2):
+        """Return the threshold search function for given attribute along with its arguments (NumPy arrays only, so
+        that the search can be run in a worker thread or process)"""
+
+        if self._store.quantised:
+            # histogram mode: candidates are the bin edges
+            idx = self._store.input_attributes.index(attribute)
+            if ways > 2:
+                return best_multiway_histogram_split, (self.histogram[idx], self._store.bin_edges[idx], ways)
+            return best_histogram_split, (self.histogram[idx], self._store.bin_edges[idx])
+
+        positions = self.positions
+
+        if ways == 2 and self.n_points * np.log2(max(self.n_points, 2)) > len(self._store):
+            # large node: filtering the cached order of all rows is cheaper than sorting the node samples
+            positions = self._store.sorted_positions(attribute, positions)
+            return best_sorted_split, (self._store.column(attribute)[positions], self._store.codes[positions],
+                                       len(self._store.classes), n)
 
-    def choose_split_attribute(self, **kwargs):
+        values, codes = self._store.column(attribute)[positions], self._store.codes[positions]
+        if ways > 2:
+            return best_multiway_split, (values, codes, len(self._store.classes), ways)
+        return best_threshold_split, (values, codes, len(self._store.classes), n)
+
+    @staticmethod
+    def _get_n_features(max_features, n_attributes):
+        """Number of attributes to consider for a split ('sqrt', 'log2', a fraction or a number)"""
+
+        if max_features == 'sqrt':
+            n = int(np.sqrt(n_attributes))
+        elif max_features == 'log2':
+            n = int(np.log2(n_attributes))
+        elif isinstance(max_features, float):
+            n = int(max_features * n_attributes)
+        else:
+            n = int(max_features)
+
+        return min(max(n, 1), n_attributes)
+
+    def choose_split_attribute(self, executor=None, ways=2, max_features=None, rng=None, **kwargs):
         """Compute information gains for splits at each attribute (for each of them, adjust the threshold) and choose
-        the best one."""
+        the best one.
+
+        If 'ways' is greater than 2, search for optimal splits into (at most) that many value ranges (see
+        choose_split_thresholds). If 'max_features' is given, only a random subset of attributes of that size
+        ('sqrt', 'log2', a fraction or a number) is considered, drawn with 'rng' (np.random.Generator). If an
+        executor (concurrent.futures.Executor) is given, the attributes are evaluated in its workers; the result is
+        the same as for the serial evaluation."""
 
         all_attributes = self.input_attributes
+
+        if max_features is not None:
+            rng = rng or np.random.default_rng()
+            chosen = rng.choice(len(all_attributes), self._get_n_features(max_features, len(all_attributes)),
+                                replace=False)
+            all_attributes = [all_attributes[i] for i in np.sort(chosen)]
+
         all_gains = len(all_attributes) * [0]
         all_thresholds = all_gains[:]
 
-        logger.debug(f"Choosing split attribute for {self}")
-        for i, attribute in enumerate(all_attributes):
-            all_gains[i], all_thresholds[i] = self.choose_split_threshold(attribute, **kwargs)
+        logger.debug("Choosing split attribute for %s", self)
+        with profiling.phase('split_search', node=self, rows=self.n_points):
+            if executor is None:
+                for i, attribute in enumerate(all_attributes):
+                    with profiling.phase('threshold_search', node=self, rows=self.n_points, attribute=attribute):
+                        all_gains[i], all_thresholds[i] = self.choose_split_thresholds(attribute, ways=ways, **kwargs)
+
+            else:
+                searches = [self._get_threshold_search(attribute, ways=ways, **kwargs) for attribute in all_attributes]
+                futures = [executor.submit(search, *args) for search, args in searches]
+                for i, future in enumerate(futures):
+                    all_gains[i], thresholds = future.result()
+                    all_thresholds[i] = thresholds if ways > 2 else [thresholds]
 
         idx = np.argmax(all_gains)
         chosen_attribute = all_attributes[idx]
-        logger.debug(f"Chosen attribute: {chosen_attribute} (expected gain: {all_gains[idx]:.3g})")
+        logger.debug("Chosen attribute: %s (expected gain: %.3g)", chosen_attribute, all_gains[idx])
+
+        return chosen_attribute, all_thresholds[idx]
 
-        return chosen_attribute, [all_thresholds[idx]]
+    @staticmethod
+    def _can_split(thresholds):
+        """Check the thresholds of the best split found (the searches return nan or no thresholds when no split
+        leaves all the children non-empty)"""
+
+        return len(thresholds) > 0 and np.isfinite(thresholds).all()
 
     def split(self, **kwargs):
-        """Split a node automatically (determine the attribute and threshold)."""
+        """Split a node automatically (determine the attribute and thresholds)."""
 
         s = self.choose_split_attribute(**kwargs)
-        logger.info(f"Splitting at attribute '{s[0]}' with threshold: {s[1][0]:.2g}")
+        logger.info("Splitting at attribute '%s' with thresholds: %s", s[0], s[1])
         self.split_at(*s)
 
     def terminate(self):
@@ -353,35 +822,395 @@ class Node(object):
             raise RuntimeError("Could not terminate a node with children")
 
         self._terminal = True
-        self._class = self.get_prevalent_label(self.class_labels.to_list())
+        self._class = self.prevalent_label
+        self._histogram = None
+
+    def quantise(self, max_bins=255):
+        """Switch the tree to the histogram training mode: quantise each input attribute once into at most max_bins
+        quantile bins, so that the split search works on per-bin class counts."""
+
+        if self.level:
+            raise RuntimeError("Attributes can be quantised only at the root node")
+
+        logger.info("Quantising input attributes into at most %d bins", max_bins)
+        with profiling.phase('quantise', node=self, rows=self.n_points):
+            self._gather()
+            self._store.quantise(max_bins=max_bins)
+        self._histogram = None
+
+    def learn(self, max_depth=5, bins=None, n_jobs=None, n_workers=None, parallel_level=1, **kwargs):
+        """Grow the decision tree to a certain maximal depth.
 
-    def learn(self, max_depth=5, **kwargs):
-        """Grow the decision tree to a certain maximal depth."""
+        If 'bins' is given, the attributes are first quantised into at most that many bins (histogram mode, see
+        quantise). If 'n_jobs' is given, the attributes are evaluated for each split in a pool of that many threads
+        (alternatively, pass any concurrent.futures executor as 'executor'). If 'n_workers' is given, the subtrees
+        rooted 'parallel_level' levels below the node are grown in a pool of that many processes (see
+        learn_parallel)."""
 
         if max_depth < 0:
             raise ValueError(f"Invalid maximal depth ({max_depth})")
 
+        if bins is not None:
+            self.quantise(max_bins=bins)
+
+        if n_jobs is not None:
+            with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                return self.learn(max_depth=max_depth, n_workers=n_workers, parallel_level=parallel_level,
+                                  executor=executor, **kwargs)
+
+        if n_workers is not None:
+            return self.learn_parallel(max_depth=max_depth, n_workers=n_workers, parallel_level=parallel_level,
+                                       **kwargs)
+
         if max_depth == 0:
-            logger.info(f"Reached the maximal depth (at {self.trace()}) - no further splitting")
+            logger.info("Reached the maximal depth (at %s) - no further splitting", self.trace())
             self.terminate()
             return 1
 
         if self.uniform:
-            logger.info(f"Node {self.trace()} is an uniform node - no further splitting")
+            logger.info("Node %s is an uniform node - no further splitting", self.trace())
             self.terminate()
             return 1
 
         if self._terminal:
-            logger.info(f"Splitting a node previously marked as terminal: {self.trace()}")
+            logger.info("Splitting a node previously marked as terminal: %s", self.trace())
             self._terminal = False
 
-        logger.info(f"Performing split of node {self.trace()}")
-        self.split(**kwargs)
+        logger.info("Performing split of node %s", self.trace())
+        attribute, thresholds = self.choose_split_attribute(**kwargs)
+        if not self._can_split(thresholds):
+            # no threshold candidate at any attribute (e.g. duplicate samples with conflicting labels)
+            logger.info("Node %s has no split candidates - no further splitting", self.trace())
+            self.terminate()
+            return 1
 
-        logger.debug(f"Learning children of node {self.trace()}")
+        logger.info("Splitting at attribute '%s' with thresholds: %s", attribute, thresholds)
+        self.split_at(attribute, thresholds)
+
+        logger.debug("Learning children of node %s", self.trace())
         for child in self.children:
             child.learn(max_depth=max_depth-1, **kwargs)
 
+    def learn_best_first(self, max_depth=None, max_leaves=None, max_nodes=None, time_budget=None, bins=None,
+                         **kwargs):
+        """Grow the decision tree best-first: always split the leaf whose best split has the highest information gain.
+
+        The best split of each new leaf is found as soon as the leaf is created and the leaves wait for splitting in
+        a priority queue. The growth stops when the queue is empty (all leaves are uniform or at max_depth), or when
+        the time budget runs out (the budget is checked before each split search, so it can be exceeded by the
+        duration of one search); splits which would exceed max_leaves or max_nodes are skipped. The remaining leaves
+        are terminated, so the tree can be pruned, tested and compiled as a tree grown with learn (without any limits,
+        the result is the same as learn with the same max_depth).
+
+        Parameters
+        ----------
+        max_depth       :   int
+            maximal depth of the tree (None - no limit)
+        max_leaves      :   int
+            maximal number of leaves
+        max_nodes       :   int
+            maximal number of nodes (including the node itself)
+        time_budget     :   float
+            wall-clock time (seconds) after which no more splits are made
+        bins            :   int
+            if given, the attributes are first quantised into at most that many bins (histogram mode, see quantise)
+        kwargs          :
+            passed to choose_split_attribute (e.g. 'ways', 'n', 'executor')
+        """
+
+        deadline = None if time_budget is None else time.perf_counter() + time_budget
+
+        if bins is not None:
+            self.quantise(max_bins=bins)
+
+        if self.children:
+            self.undo_split()
+        self._terminal = False
+
+        queue = []
+        counter = itertools.count()     # ties - the leaf created first goes first
+
+        def enqueue(node):
+            if (node.n_classes < 2 or (max_depth is not None and node.level - self.level >= max_depth) or
+                    (deadline is not None and time.perf_counter() > deadline)):
+                node.terminate()
+                return
+
+            attribute, thresholds = node.choose_split_attribute(**kwargs)
+            if not node._can_split(thresholds):
+                node.terminate()
+                return
+
+            gain = node.get_split_information_gain(attribute, thresholds)
+            heapq.heappush(queue, (-gain, next(counter), node, attribute, thresholds))
+
+        enqueue(self)
+        n_leaves = n_nodes = 1
+
+        while queue:
+            if deadline is not None and time.perf_counter() > deadline:
+                logger.info("Time budget exhausted - terminating %d leaves", len(queue))
+                break
+
+            neg_gain, _, node, attribute, thresholds = heapq.heappop(queue)
+
+            # a child for each value range, plus one for missing values (see split_at)
+            n_children = len(thresholds) + 1 + int(np.isnan(self._store.column(attribute)[node.positions]).any())
+            if ((max_leaves is not None and n_leaves + n_children - 1 > max_leaves) or
+                    (max_nodes is not None and n_nodes + n_children > max_nodes)):
+                logger.debug("Split of node %s would exceed the size limits - terminating", node.trace())
+                node.terminate()
+                continue
+
+            logger.info("Splitting node %s at attribute '%s' (expected gain: %.3g)", node.trace(), attribute,
+                        -neg_gain)
+            node.split_at(attribute, thresholds)
+            n_leaves += len(node.children) - 1
+            n_nodes += len(node.children)
+
+            for child in node.children:
+                enqueue(child)
+
+        for _, _, node, _, _ in queue:
+            node.terminate()
+
+        logger.info("Grown a tree with %d nodes and %d leaves (best-first)", n_nodes, n_leaves)
+
+    def learn_parallel(self, max_depth=5, n_workers=None, parallel_level=1, **kwargs):
+        """Grow the decision tree, building the subtrees below a given level in parallel worker processes.
+
+        The tree is first grown serially down to 'parallel_level' levels below the node. The subtrees of the nodes
+        at that level are then grown in a process pool (each worker receives the training data once) and grafted
+        back into the tree by replaying their splits, so the result is the same as for the serial learning."""
+
+        if parallel_level < 1:
+            raise ValueError(f"Invalid level for parallel learning ({parallel_level})")
+
+        top_depth = min(max_depth, parallel_level)
+        self.learn(max_depth=top_depth, **kwargs)
+
+        if max_depth == top_depth:
+            return
+
+        frontier = [node for node in self._get_terminal_nodes()
+                    if node.level == self.level + top_depth and node.n_classes > 1]
+        if not frontier:
+            return
+
+        kwargs.pop('executor', None)  # thread pools are not shared with worker processes
+        logger.info("Growing %d subtrees (level %d) in %s processes", len(frontier), self.level + top_depth, n_workers)
+
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_subtree_worker,
+                                 initargs=(self._store,)) as pool:
+            futures = [pool.submit(_grow_subtree, node.positions, max_depth - top_depth, kwargs) for node in frontier]
+
+            for node, future in zip(frontier, futures):
+                logger.debug("Grafting subtree grown in a worker process at node %s", node.trace())
+                node._terminal = False
+                node._graft(future.result())
+
+    def _get_terminal_nodes(self):
+        """List all terminal nodes of the (sub)tree"""
+
+        if self._terminal:
+            return [self]
+
+        return [node for child in self.children for node in child._get_terminal_nodes()]
+
+    def _export_splits(self):
+        """Describe the splits of the (sub)tree as nested tuples: (attribute, thresholds, children) or None for
+        a terminal node"""
+
+        if not self.children:
+            return None
+
+        return self._split_attribute, self._split_thresholds[1:-1], [child._export_splits() for child in self.children]
+
+    def _graft(self, splits):
+        """Rebuild a (sub)tree by replaying splits exported with _export_splits"""
+
+        if splits is None:
+            self.terminate()
+            return
+
+        attribute, thresholds, children_splits = splits
+        self.split_at(attribute, thresholds)
+
+        for child, child_splits in zip(self.children, children_splits):
+            child._graft(child_splits)
+
+    def update(self, new_rows: pd.DataFrame, max_depth=5, min_fraction=0.1, confidence=1e-6, **kwargs):
+        """Update the trained tree with new training samples instead of learning it again.
+
+        The new samples are routed down the tree (updating the class occurrences of the nodes on their way) and
+        appended to the leaves they reach; the samples of a node are laid out in the sample order together with the
+        new ones only when they are needed (e.g. for a split search). The split of a node is reconsidered only once
+        the node has received at least min_fraction of the samples it had when the split was last chosen, so the
+        split searches done per update scale with the number of new samples. The node is then re-split (and its subtree grown again, as in
+        learn) only if the gain of the best split exceeds the gain of the current one (zero for a leaf) by more than
+        the Hoeffding bound for given confidence - splits are not changed because of sampling noise.
+
+        Parameters
+        ----------
+        new_rows        :   pandas.DataFrame
+            new samples (all attributes, including the target attribute; index labels not present in the data)
+        max_depth       :   int
+            maximal depth of the tree (as in learn)
+        min_fraction    :   float
+            relative number of new samples in a node that triggers reconsidering its split
+        confidence      :   float
+            probability of re-splitting a node although its current split is the best one (Hoeffding bound)
+        kwargs          :
+            passed to choose_split_attribute (e.g. 'ways', 'n', 'executor')
+        """
+
+        if self.level:
+            raise RuntimeError("The tree can be updated only at the root node")
+
+        positions = self._store.append(new_rows)
+        logger.info("Updating the tree with %d new samples", len(positions))
+
+        reached = set()
+        self._absorb(positions, reached)
+        self._refresh(max_depth, min_fraction, confidence, reached, kwargs)
+
+        laid_out = self._stop - self._start
+        if (len(self._store.order) - laid_out) + (self._n_points - laid_out) > laid_out:
+            # the samples moved or received since the tree was last laid out outnumber the rest - lay it out again
+            self._gather()
+
+    def _absorb(self, positions, reached):
+        """Route new samples (row positions) down the (sub)tree, updating class occurrences of the nodes; record the
+        nodes reached in 'reached'"""
+
+        if not self.resolved:
+            raise RuntimeError(f"Node {self.trace()} is not resolved - train the tree first")
+
+        reached.add(id(self))
+        self._pending.append(positions)
+        self.set_label_counts(self._counts + np.bincount(self._store.codes[positions],
+                                                         minlength=len(self._store.classes)))
+        self._histogram = None
+
+        if self.children:
+            ranges = self._get_value_ranges(self._split_attribute, self._split_thresholds, positions)
+            which_child = np.minimum(ranges, len(self.children) - 1)    # missing values go to the last child
+
+            for i, child in enumerate(self.children):
+                child_positions = positions[which_child == i]
+                if len(child_positions):
+                    child._absorb(child_positions, reached)
+
+    def _gather(self):
+        """Lay out the samples of the (sub)tree, including the ones received since the last layout (see update), in a
+        new contiguous slice at the end of the sample order (the root's samples replace the whole sample order)"""
+
+        if not self._pending:
+            return
+
+        if self.level:
+            start = self._store.reserve(self._n_points)
+            self._lay_out(self._store.order, start)
+        else:
+            order = np.empty(self._n_points, dtype=self._store.order.dtype)
+            self._lay_out(order, 0)
+            self._store.order = order
+
+    def _lay_out(self, order, start):
+        """Copy the samples of the (sub)tree to 'order' (the sample order or a new one) starting at 'start' and move
+        the slices of the nodes there: children one after another, the new samples of a leaf after its old ones.
+        Return the end of the (sub)tree's slice."""
+
+        if not self._pending:
+            stop = start + self._stop - self._start
+            order[start:stop] = self._store.order[self._start:self._stop]
+            self._shift(start - self._start)
+
+            return stop
+
+        if self.children:
+            stop = start
+            for child in self.children:
+                stop = child._lay_out(order, stop)
+            self._split_pos = stop
+        else:
+            stop = start + self._n_points
+            order[start:stop] = np.concatenate([self._store.order[self._start:self._stop]] + self._pending)
+            self._split_pos = start
+
+        self._start, self._stop = start, stop
+        self._pending = []
+
+        return stop
+
+    def _shift(self, offset):
+        """Move the slices of the (sub)tree's nodes in the sample order by 'offset'"""
+
+        self._start += offset
+        self._split_pos += offset
+        self._stop += offset
+
+        for child in self.children:
+            child._shift(offset)
+
+    def _refresh(self, max_depth, min_fraction, confidence, reached, kwargs):
+        """Reconsider the splits of the nodes that received enough new samples (see update)"""
+
+        if id(self) not in reached:
+            return
+
+        if self._terminal:
+            self._class = self.prevalent_label
+
+        remaining = max_depth - self.level
+        if (remaining > 0 and not self.uniform and
+                self._n_points - self._n_checked >= min_fraction * self._n_checked and
+                self._resplit(remaining, confidence, kwargs)):
+            return
+
+        for child in self.children:
+            child._refresh(max_depth, min_fraction, confidence, reached, kwargs)
+
+    def _hoeffding_bound(self, confidence):
+        """Difference of information gains which the mean gain over n_points samples exceeds with probability below
+        'confidence' (the gain ranges from 0 to log2 of the number of classes)"""
+
+        gain_range = np.log2(max(len(self._store.classes), 2))
+
+        return gain_range * np.sqrt(np.log(1 / confidence) / (2 * self._n_points))
+
+    def _resplit(self, max_depth, confidence, kwargs):
+        """Choose the best split of the node again; if it is significantly better than the current one, replace the
+        node's subtree with a subtree grown to max_depth. Return True if the node was re-split."""
+
+        self._n_checked = self._n_points
+        attribute, thresholds = self.choose_split_attribute(**kwargs)
+        self._histogram = None
+        if not self._can_split(thresholds):
+            return False
+
+        if self.children:
+            if attribute == self._split_attribute and list(thresholds) == list(self._split_thresholds[1:-1]):
+                return False
+            current_gain = self.get_split_information_gain(self._split_attribute, self._split_thresholds[1:-1])
+        else:
+            current_gain = 0.
+
+        gain = self.get_split_information_gain(attribute, thresholds)
+        if gain - current_gain <= self._hoeffding_bound(confidence):
+            return False
+
+        logger.info("Re-splitting node %s at attribute '%s' (gain: %.3g, previously %.3g)", self.trace(), attribute,
+                    gain, current_gain)
+        self.undo_split()
+        self._terminal = False
+        self.split_at(attribute, thresholds)
+
+        for child in self.children:
+            child.learn(max_depth=max_depth-1, **kwargs)
+
+        return True
+
     def print_terminal_labels(self):
         """Print sample labels at each terminal node."""
 
@@ -406,7 +1235,7 @@ class Node(object):
 
         if len(self.children):
             if any(child.n_points < min_points for child in self.children):
-                logger.info(f"Pruning at node {self.trace()}")
+                logger.info("Pruning at node %s", self.trace())
                 self.undo_split()
                 self.terminate()
 
@@ -444,35 +1273,75 @@ class Node(object):
 
         return self._get_child_from_df(observation).predict_class(observation)
 
-    def predict_classes(self, observations: pd.DataFrame):
-        """Predict classes for a set of observations."""
+    def compile(self):
+        """Convert the trained (sub)tree into flat arrays for vectorised batch prediction (see CompiledTree)."""
+
+        with profiling.phase('compile', node=self, rows=self.n_points):
+            attributes = self.input_attributes
+            attribute_idx = {attr: i for i, attr in enumerate(attributes)}
+
+            nodes = [self]
+            first_child = []
+
+            # breadth-first numbering - children of each node get consecutive numbers
+            for node in nodes:
+                if node._terminal:
+                    first_child.append(-1)
+                elif node.children:
+                    first_child.append(len(nodes))
+                    nodes.extend(node.children)
+                else:
+                    raise RuntimeError(f"Node {node.trace()} is neither terminal nor split - train the tree first")
+
+            max_thresholds = max(len(node.split_thresholds) - 2 if node.children else 0 for node in nodes)
+            thresholds = np.full((len(nodes), max_thresholds), inf)
+            feature = np.full(len(nodes), -1)
+
+            for i, node in enumerate(nodes):
+                if node.children:
+                    feature[i] = attribute_idx[node.split_attribute]
+                    inner = node.split_thresholds[1:-1]
+                    thresholds[i, :len(inner)] = inner
+
+            n_children = [len(node.children) for node in nodes]
+            labels = [node._class if node._terminal else node.prevalent_label for node in nodes]
+            levels = [node.level - self.level for node in nodes]
+            n_points = [node.n_points for node in nodes]
+
+        return CompiledTree(attributes, feature, thresholds, first_child, n_children,
+                            np.array(labels, dtype=self.classes.dtype), levels, n_points)
+
+    def save(self, fname):
+        """Save the trained (sub)tree in a compact binary file (no training data is stored); load it with
+        CompiledTree.load."""
 
-        classes = []
+        self.compile().save(fname)
 
-        n = len(observations)
+    def predict_classes(self, observations: pd.DataFrame, max_depth=None, min_points=None):
+        """Predict classes for a set of observations (vectorised, using the compiled tree).
 
-        for i in range(n):
-            obs = observations.iloc[i]
-            classes.append(self.predict_class(obs))
+        If max_depth and/or min_points are given, predict as if the tree was truncated at that depth and/or pruned
+        with that min_points (see prune) - without modifying the tree."""
 
-        return classes
+        return self.compile().predict(observations, max_depth=max_depth, min_points=min_points).tolist()
 
-    def test(self, observations: pd.DataFrame):
-        """Predict classes for a set of observations and report the testing score."""
+    def test(self, observations: pd.DataFrame, **kwargs):
+        """Predict classes for a set of observations and report the testing score (kwargs: see predict_classes)."""
 
-        pred_classes = self.predict_classes(observations)               # predicted classes
+        pred_classes = self.predict_classes(observations, **kwargs)     # predicted classes
         true_classes = observations[self.target_attribute].to_list()    # actual classes
 
         n = len(true_classes)
         correct = sum(pred_classes[i] == true_classes[i] for i in range(n))
         score = correct / n
 
-        logger.info(f"Testing score: {score} ({correct}/{n} samples)")
+        logger.info("Testing score: %s (%d/%d samples)", score, correct, n)
 
         return true_classes, pred_classes
 
     @staticmethod
-    def train_and_test(data: pd.DataFrame, train_idx, test_idx, target_column=0, max_depth=5, min_points=2, n=10):
+    def train_and_test(data: pd.DataFrame, train_idx, test_idx, target_column=0, max_depth=5, min_points=2, n=1,
+                       bins=None, n_jobs=None, ways=2):
         """Initialise, train and test a decision tree.
 
         Parameters
@@ -490,17 +1359,40 @@ class Node(object):
         min_points      :   int
             minimal number of samples in a leaf (if less, the node will be pruned - its parent's split will be undone
         n               :   int
-            granularity for the threshold search (use every n-th value);
-            learning time grows approximately inversely proportionally to n
+            granularity for the threshold search (use every n-th value); the search is vectorised, so n=1
+            (exhaustive search) is affordable
+        bins            :   int
+            if given, train in the histogram mode with attributes quantised into at most that many bins
+        n_jobs          :   int
+            if given, evaluate split attributes in parallel in that many threads
+        ways            :   int
+            maximal number of children of a node (optimal multiway splits for ways > 2)
         """
 
         # Initialise a decision tree
         tree = Node(data, target_column=target_column, indices=train_idx)
 
         # perform learning
-        tree.learn(max_depth=max_depth, n=n)
+        tree.learn(max_depth=max_depth, n=n, bins=bins, n_jobs=n_jobs, ways=ways)
 
         # prune
         tree.prune(min_points=min_points)
 
         return tree.test(data.iloc[test_idx])
+
+
+_subtree_store = None   # training data of a subtree worker process (see Node.learn_parallel)
+
+
+def _init_subtree_worker(store):
+    global _subtree_store
+    _subtree_store = store
+
+
+def _grow_subtree(positions, max_depth, kwargs):
+    """Grow a subtree from given samples in a worker process and export its splits"""
+
+    subtree = Node(_subtree_store.with_order(positions))
+    subtree.learn(max_depth=max_depth, **kwargs)
+
+    return subtree._export_splits()
@@ -0,0 +1,162 @@
+"""Random forest (bagged ensemble of decision trees) built on the decision tree implementation"""
+
+import numpy as np
+import pandas as pd
+import logging
+from concurrent.futures import ProcessPoolExecutor
+
+from decisiontree import Node, TreeData
+from sharedframe import SharedFrame
+
+logger = logging.getLogger(__name__)
+
+
+_forest_store = None    # training data of a forest worker process (see Forest.learn)
+_forest_shm = None
+
+
+def _init_forest_worker(spec, target_column, train_positions, bins):
+    global _forest_shm, _forest_store
+    _forest_shm, frame = SharedFrame.attach(spec)
+    _forest_store = _make_store(frame, target_column, train_positions, bins)
+
+
+def _make_store(frame, target_column, train_positions, bins):
+    """Training data shared by all trees (column arrays, sorted column orders and bins are computed once)"""
+
+    store = TreeData(frame, target_column=target_column)
+    store.order = train_positions
+    if bins is not None:
+        store.quantise(max_bins=bins)
+
+    return store
+
+
+def _grow_tree(store, seed, max_depth, min_points, bootstrap, learn_kwargs):
+    """Grow a single tree of the forest on a bootstrap sample and return it compiled"""
+
+    rng = np.random.default_rng(seed)
+    positions = store.order
+    if bootstrap:
+        positions = positions[rng.integers(len(positions), size=len(positions))]
+
+    tree = Node(store.with_order(positions))
+    tree.learn(max_depth=max_depth, rng=rng, **learn_kwargs)
+    tree.prune(min_points=min_points)
+
+    return tree.compile()
+
+
+def _grow_tree_in_worker(seed, max_depth, min_points, bootstrap, learn_kwargs):
+    return _grow_tree(_forest_store, seed, max_depth, min_points, bootstrap, learn_kwargs)
+
+
+class Forest(object):
+    """Random forest - decision trees grown on bootstrap samples with random attribute subsets at each split;
+    predictions by majority vote."""
+
+    def __init__(self, n_trees=100, max_depth=5, min_points=1, max_features='sqrt', bootstrap=True, bins=None,
+                 random_state=0, n_jobs=None, **learn_kwargs):
+        """Initialise a forest.
+
+        Parameters
+        ----------
+        n_trees         :   int
+            number of trees
+        max_depth       :   int
+            maximal depth of each tree
+        min_points      :   int
+            minimal number of samples in a leaf (see Node.prune)
+        max_features    :   str, int or float
+            number of attributes considered at each split ('sqrt', 'log2', a fraction or a number; None - all)
+        bootstrap       :   bool
+            if True, each tree is grown on a bootstrap sample of the training data
+        bins            :   int
+            if given, grow the trees in the histogram mode (attributes quantised once for all trees)
+        random_state    :   int
+            seed of the random number generators (the forest does not depend on n_jobs)
+        n_jobs          :   int
+            if given, grow the trees in a pool of that many processes (sharing one copy of the data)
+        learn_kwargs    :
+            passed to Node.learn
+        """
+
+        self.n_trees = n_trees
+        self.max_depth = max_depth
+        self.min_points = min_points
+        self.max_features = max_features
+        self.bootstrap = bootstrap
+        self.bins = bins
+        self.random_state = random_state
+        self.n_jobs = n_jobs
+        self.learn_kwargs = learn_kwargs
+
+        self.trees = []
+        self.classes = None
+        self.target_attribute = None
+
+    def __str__(self):
+        return f"Random forest of {len(self.trees)} trees (maximal depth {self.max_depth})"
+
+    def learn(self, data: pd.DataFrame, target_column=0, indices=None):
+        """Grow the trees of the forest on the training data (optionally, only the samples with given indices)."""
+
+        Node._validate_data(data, target_column)
+        self.target_attribute = data.keys()[target_column]
+
+        store = TreeData(data, target_column=target_column, indices=indices)
+        self.classes = store.classes
+
+        seeds = np.random.SeedSequence(self.random_state).spawn(self.n_trees)
+        learn_kwargs = dict(self.learn_kwargs, max_features=self.max_features)
+        args = (self.max_depth, self.min_points, self.bootstrap, learn_kwargs)
+
+        logger.info("Growing a forest of %d trees on %d samples", self.n_trees, len(store.order))
+        if self.n_jobs is None:
+            if self.bins is not None:
+                store.quantise(max_bins=self.bins)
+            self.trees = [_grow_tree(store, seed, *args) for seed in seeds]
+
+        else:
+            with SharedFrame(data) as shared:
+                with ProcessPoolExecutor(max_workers=self.n_jobs, initializer=_init_forest_worker,
+                                         initargs=(shared.spec, target_column, store.order, self.bins)) as pool:
+                    futures = [pool.submit(_grow_tree_in_worker, seed, *args) for seed in seeds]
+                    self.trees = [future.result() for future in futures]
+
+        return self
+
+    def predict_classes(self, observations):
+        """Predict classes for a set of observations by majority vote of the trees (ties - the lowest label)."""
+
+        if isinstance(observations, pd.DataFrame):
+            observations = observations[self.trees[0].attributes].to_numpy(dtype=float)
+
+        votes = np.searchsorted(self.classes, np.stack([tree.predict(observations) for tree in self.trees]))
+
+        n, n_cls = votes.shape[1], len(self.classes)
+        counts = np.bincount((np.arange(n) * n_cls + votes).ravel(), minlength=n * n_cls).reshape(n, n_cls)
+
+        return self.classes[np.argmax(counts, axis=1)].tolist()
+
+    def test(self, observations: pd.DataFrame):
+        """Predict classes for a set of observations and report the testing score."""
+
+        pred_classes = self.predict_classes(observations)
+        true_classes = observations[self.target_attribute].to_list()
+
+        n = len(true_classes)
+        correct = sum(pred_classes[i] == true_classes[i] for i in range(n))
+
+        logger.info("Testing score: %s (%d/%d samples)", correct / n, correct, n)
+
+        return true_classes, pred_classes
+
+    @staticmethod
+    def train_and_test(data: pd.DataFrame, train_idx, test_idx, target_column=0, **kwargs):
+        """Initialise, train and test a forest (kwargs - see Forest.__init__); the counterpart of Node.train_and_test
+        (e.g. for aux_functions.cross_validate_tree with model=Forest)."""
+
+        forest = Forest(**kwargs).learn(data, target_column=target_column, indices=train_idx)
+
+        return forest.test(data.iloc[test_idx])
@@ -0,0 +1,182 @@
+"""Runner of a pipeline of stages with results cached on disk.
+
+A stage is a function called with the results of the stages it depends on and its parameters. It is identified by a
+key: a hash of its name and function, its parameters, the configuration values it reads and the keys of its
+dependencies, so a change anywhere upstream changes the keys of all the stages below. Results of cached stages are
+pickled to the cache directory under their keys and reused by later runs; independent stages run concurrently (in
+threads - stages doing heavy work should use process pools themselves, e.g. aux_functions.run_parallel).
+
+Changes of the code of a stage function are not detected: clear the cache directory after modifying it."""
+
+import pandas as pd
+import hashlib
+import json
+import logging
+import os
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+
+def frame_fingerprint(df):
+    """Hash of a data frame (values, index and column names)"""
+
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    digest.update(json.dumps([str(key) for key in df.keys()]).encode())
+
+    return digest.hexdigest()
+
+
+class Stage(object):
+    def __init__(self, name, func, deps=(), params=None, config_keys=(), cache=True, fingerprint=None):
+        """Define a stage.
+
+        Parameters
+        ----------
+        name            :   str
+            name of the stage (unique in the pipeline)
+        func            :   callable
+            function computing the result: func(*results of deps, **params)
+        deps            :   sequence
+            names of the stages whose results are passed to func
+        params          :   dict
+            keyword arguments of func (their repr is hashed)
+        config_keys     :   sequence
+            configuration values read by func: section names (all the values of the section) or (section, option)
+        cache           :   bool
+            if False, the stage is computed on every run (e.g. cheap data loading) and not stored
+        fingerprint     :   callable
+            for a stage that is not cached - function hashing its result, making the keys of the stages below depend
+            on the result itself (e.g. frame_fingerprint for the loaded data)
+        """
+
+        self.name = name
+        self.func = func
+        self.deps = tuple(deps)
+        self.params = params or {}
+        self.config_keys = tuple(config_keys)
+        self.cache = cache
+        self.fingerprint = fingerprint
+
+
+class Pipeline(object):
+    def __init__(self, config=None, cache_dir=None, n_jobs=None):
+        """Create an empty pipeline.
+
+        Parameters
+        ----------
+        config          :   configparser.ConfigParser
+            configuration read by the stages (see Stage.config_keys)
+        cache_dir       :   str
+            directory of the cached stage results (None - results are kept only in memory)
+        n_jobs          :   int
+            maximal number of stages run concurrently (None - no limit)
+        """
+
+        self.config = config
+        self.cache_dir = cache_dir
+        self.n_jobs = n_jobs
+        self.stages = {}
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def add(self, name, func, deps=(), **kwargs):
+        """Add a stage (kwargs: see Stage); its dependencies have to be added first"""
+
+        if name in self.stages:
+            raise ValueError(f"Stage {name} is already defined")
+        unknown = [dep for dep in deps if dep not in self.stages]
+        if unknown:
+            raise ValueError(f"Unknown dependencies of stage {name}: {unknown}")
+
+        self.stages[name] = Stage(name, func, deps, **kwargs)
+        return self
+
+    def _config_values(self, stage):
+        values = []
+        for entry in stage.config_keys:
+            if isinstance(entry, str):
+                values.append([entry, sorted(self.config[entry].items())])
+            else:
+                values.append([*entry, self.config[entry[0]][entry[1]]])
+
+        return values
+
+    def key(self, stage, dep_keys):
+        """Key of a stage given the keys of its dependencies"""
+
+        params = sorted((name, repr(value)) for name, value in stage.params.items())
+        description = [stage.name, stage.func.__module__, stage.func.__qualname__, params,
+                       self._config_values(stage), list(dep_keys)]
+
+        return hashlib.sha256(json.dumps(description).encode()).hexdigest()
+
+    def _fname(self, stage, key):
+        return os.path.join(self.cache_dir, f'{stage.name}-{key}.pkl')
+
+    def _run_stage(self, stage, dep_results, dep_keys):
+        key = self.key(stage, dep_keys)
+
+        if stage.cache and self.cache_dir is not None and os.path.exists(self._fname(stage, key)):
+            logger.info("Stage %s: reusing cached result", stage.name)
+            with open(self._fname(stage, key), 'rb') as f:
+                return key, pickle.load(f)
+
+        logger.info("Stage %s: running", stage.name)
+        start = time.perf_counter()
+        result = stage.func(*dep_results, **stage.params)
+        logger.info("Stage %s: finished in %.3g s", stage.name, time.perf_counter() - start)
+
+        if not stage.cache:
+            if stage.fingerprint is not None:
+                key = hashlib.sha256((key + stage.fingerprint(result)).encode()).hexdigest()
+
+        elif self.cache_dir is not None:
+            tmp_fname = self._fname(stage, key) + '.tmp'
+            with open(tmp_fname, 'wb') as f:
+                pickle.dump(result, f)
+            os.replace(tmp_fname, self._fname(stage, key))
+
+        return key, result
+
+    def _required(self, targets):
+        """Names of the stages needed for the targets (in the order of definition)"""
+
+        required = set()
+        stack = list(targets)
+        while stack:
+            name = stack.pop()
+            if name not in required:
+                required.add(name)
+                stack.extend(self.stages[name].deps)
+
+        return [name for name in self.stages if name in required]
+
+    def run(self, targets=None):
+        """Run the stages needed for the targets (None - all the stages); return the results of the run stages
+        (dictionary by stage name).
+
+        A stage starts as soon as all its dependencies are finished, so independent stages run concurrently."""
+
+        pending = self._required(targets if targets is not None else self.stages)
+        keys, results, running = {}, {}, {}
+
+        with ThreadPoolExecutor(max_workers=self.n_jobs or len(pending) or 1) as pool:
+            while pending or running:
+                for name in [name for name in pending if all(dep in results for dep in self.stages[name].deps)]:
+                    pending.remove(name)
+                    stage = self.stages[name]
+                    future = pool.submit(self._run_stage, stage, [results[dep] for dep in stage.deps],
+                                         [keys[dep] for dep in stage.deps])
+                    running[future] = name
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    keys[name], results[name] = future.result()
+
+        return results
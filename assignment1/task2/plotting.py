@@ -0,0 +1,45 @@
+"""ROC curves of classification results (scikit-learn and matplotlib are imported on first use)"""
+
+import numpy as np
+
+
+def calculate_roc(labels_true, labels_pred):
+    # Note: the ROC/ROC AUC calculation and plotting has been prepared based on:
+    # https://scikit-learn.org/stable/auto_examples/model_selection/plot_roc.html
+    from sklearn import metrics
+
+    classes = list(set(labels_true))
+    labels_true_bin = np.asarray(labels_true)[:, np.newaxis] == np.array(classes)  # one column per class (also binary)
+    labels_pred = np.array(labels_pred)
+
+    fpr = dict()
+    tpr = dict()
+    roc_auc = dict()
+    for i in range(len(classes)):
+        c = classes[i]
+        y_score = labels_pred == c
+        fpr[c], tpr[c], _ = metrics.roc_curve(labels_true_bin[:, i], y_score)
+        roc_auc[c] = metrics.auc(fpr[c], tpr[c])
+
+    return fpr, tpr, roc_auc
+
+
+def plot_roc_curve(fpr: dict, tpr: dict, roc_auc: dict, title=None):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots()
+    ax.plot([0, 1], [0, 1], 'k--', lw=1.5)
+    for c in fpr.keys():
+        ax.plot(fpr[c], tpr[c], label=f"class {c} (ROC AUC: {roc_auc[c]:.2g})", lw=2.5)
+    ax.legend(fancybox=True, framealpha=0.5)
+    ax.set_xlabel("False Positive Rate")
+    ax.set_ylabel("True Positive Rate")
+    ax.set_aspect('equal')
+    ax.set_title(title or "ROC curves", fontsize=14)
+    plt.grid()
+    plt.show()
+
+
+def calculate_and_plot_roc(*args, **kwargs):
+    title = kwargs.pop('title', None)
+    plot_roc_curve(*calculate_roc(*args, **kwargs), title=title)
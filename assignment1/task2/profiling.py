@@ -0,0 +1,149 @@
+"""Opt-in profiling of decision tree training and prediction.
+
+When enabled, the instrumented code records cumulative counters (see COUNTERS) and, for each node and phase of the
+work (see PHASES), the wall time, the number of rows and the counter increments. When disabled (default), every
+instrumented point costs a single attribute check (or a call returning a shared no-op context manager).
+
+Work done in worker processes (Node.learn with n_workers, Forest with n_jobs) is not recorded."""
+
+import json
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+
+COUNTERS = {
+    'candidate_thresholds': "threshold candidates scored in split searches",
+    'split_gains': "information gains (or segment remainders, for multiway splits) computed",
+    'entropy_calls': "calls of the entropy computation",
+    'entropy_rows': "class occurrence vectors whose entropy was computed",
+    'routing_iterations': "iterations of the vectorised prediction (one per level reached)",
+    'routing_steps': "single-level moves of observations down the tree in prediction",
+}
+
+PHASES = {
+    'split_search': "choosing the split attribute and thresholds of a node (Node.choose_split_attribute)",
+    'threshold_search': "search for the best split at a single attribute (nested in 'split_search')",
+    'partition': "distributing the node samples among the children (Node.split_at)",
+    'quantise': "quantising the input attributes (histogram mode)",
+    'compile': "converting a tree to flat arrays (Node.compile)",
+    'predict': "routing observations through a compiled tree (CompiledTree.apply)",
+}
+
+enabled = False         # checked at every instrumented point
+counters = Counter()    # cumulative counters
+records = []            # one record per node and phase
+
+_lock = threading.Lock()
+_no_phase = nullcontext()
+
+
+def enable(reset_records=True):
+    """Start profiling (by default, discarding the counters and records collected so far)"""
+
+    global enabled
+    if reset_records:
+        reset()
+    enabled = True
+
+
+def disable():
+    """Stop profiling (the counters and records are kept until reset)"""
+
+    global enabled
+    enabled = False
+
+
+def reset():
+    """Discard the counters and records"""
+
+    with _lock:
+        counters.clear()
+        records.clear()
+
+
+def count(name, value=1):
+    """Add to a cumulative counter (callers check 'enabled' first, so that disabled profiling costs nothing)"""
+
+    with _lock:
+        counters[name] += int(value)
+
+
+class _Phase(object):
+    """Context manager recording a phase of the work done on a node"""
+
+    def __init__(self, name, node, rows, attribute):
+        self.record = dict(phase=name, rows=int(rows))
+        if node is not None:
+            self.record.update(node=node.trace(), level=node.level)
+        if attribute is not None:
+            self.record['attribute'] = attribute
+
+    def __enter__(self):
+        with _lock:
+            self._counters = counters.copy()
+        self._start = time.perf_counter()
+        return self.record
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.record['time'] = time.perf_counter() - self._start
+        with _lock:
+            self.record.update((name, value) for name, value in (counters - self._counters).items())
+            records.append(self.record)
+
+
+def phase(name, node=None, rows=0, attribute=None):
+    """Context manager recording a phase of the work (optionally, on a given node and attribute); a no-op if
+    profiling is disabled"""
+
+    if not enabled:
+        return _no_phase
+
+    return _Phase(name, node, rows, attribute)
+
+
+def _aggregate(selected, key):
+    summary = {}
+    for record in selected:
+        entry = summary.setdefault(key(record), dict(calls=0, time=0., rows=0))
+        entry['calls'] += 1
+        for name in ('time', 'rows') + tuple(COUNTERS):
+            if name in record:
+                entry[name] = entry.get(name, 0) + record[name]
+
+    return summary
+
+
+def report(nodes=True):
+    """Return the profile as a dictionary.
+
+    Keys: 'counters' (cumulative counters), 'phases' (totals per phase), 'levels' (totals per tree level and phase),
+    'attributes' (totals of the threshold searches per attribute) and, if 'nodes' is True, 'nodes' (all the records:
+    phase, node trace, level, attribute, rows, time and counter increments)."""
+
+    with _lock:
+        selected = list(records)
+        profile = dict(counters=dict(counters))
+
+    profile['phases'] = _aggregate(selected, lambda record: record['phase'])
+
+    levels = {}
+    for (level, name), entry in _aggregate([record for record in selected if 'level' in record],
+                                           lambda record: (record['level'], record['phase'])).items():
+        levels.setdefault(level, {})[name] = entry
+    profile['levels'] = dict(sorted(levels.items()))
+
+    profile['attributes'] = _aggregate([record for record in selected if record['phase'] == 'threshold_search'],
+                                       lambda record: str(record['attribute']))
+
+    if nodes:
+        profile['nodes'] = selected
+
+    return profile
+
+
+def save_report(fname, nodes=True):
+    """Save the profile (see report) as a JSON file"""
+
+    with open(fname, 'w') as f:
+        json.dump(report(nodes=nodes), f, indent=2)
@@ -0,0 +1,73 @@
+"""Sharing a numeric data frame between processes without copying it (via multiprocessing.shared_memory)"""
+
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class SharedFrame(object):
+    """Numeric data frame copied once into a shared memory block.
+
+    Other processes attach to the block using the (picklable) 'spec' and get a data frame whose columns are views of
+    the shared memory. The creating process owns the block - use as a context manager or call close() to release it.
+    """
+
+    def __init__(self, frame: pd.DataFrame):
+        arrays = [frame[key].to_numpy() for key in frame.keys()]
+        if isinstance(frame.index, pd.RangeIndex):
+            index = (frame.index.start, frame.index.stop, frame.index.step)
+        else:
+            index = None
+            arrays.append(frame.index.to_numpy())
+
+        for key, array in zip(frame.keys(), arrays):
+            if array.dtype.hasobject:
+                raise TypeError(f"Only numeric columns can be shared (column '{key}' has dtype {array.dtype})")
+
+        # lay out the arrays one after another (8-byte aligned)
+        layout = []
+        offset = 0
+        for array in arrays:
+            layout.append((array.dtype.str, offset))
+            offset += -(-array.nbytes // 8) * 8
+
+        self._shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        for array, (dtype, offset) in zip(arrays, layout):
+            np.ndarray(array.shape, dtype=dtype, buffer=self._shm.buf, offset=offset)[:] = array
+
+        self.spec = dict(name=self._shm.name, columns=frame.keys().to_list(), layout=layout, n_rows=len(frame),
+                         index=index)
+        logger.debug("Data frame of shape %s copied to shared memory block '%s'", frame.shape, self._shm.name)
+
+    @staticmethod
+    def attach(spec):
+        """Attach to a shared frame described by 'spec'; return the shared memory block (keep a reference to it as
+        long as the frame is in use) and the data frame."""
+
+        shm = shared_memory.SharedMemory(name=spec['name'])
+        arrays = [np.ndarray(spec['n_rows'], dtype=dtype, buffer=shm.buf, offset=offset)
+                  for dtype, offset in spec['layout']]
+
+        if spec['index'] is None:
+            index = pd.Index(arrays.pop())
+        else:
+            index = pd.RangeIndex(*spec['index'])
+
+        frame = pd.DataFrame(dict(zip(spec['columns'], arrays)), index=index, copy=False)
+
+        return shm, frame
+
+    def close(self):
+        """Release the shared memory block"""
+
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,157 @@
+"""Cross-validation and tuning of scikit-learn classifiers (for comparison with the decision tree)"""
+
+import numpy as np
+import pandas as pd
+import hashlib
+import json
+import logging
+import os
+
+from aux_functions import kfold_splits, run_parallel, calculate_metrics
+from plotting import calculate_and_plot_roc
+
+logger = logging.getLogger(__name__)
+
+
+def data_fingerprint(data_x, data_y):
+    """Hash of the data (values, index and column names) identifying it in the fold cache"""
+
+    digest = hashlib.sha256()
+    digest.update(pd.util.hash_pandas_object(data_x, index=True).to_numpy().tobytes())
+    digest.update(pd.util.hash_pandas_object(data_y, index=True).to_numpy().tobytes())
+    digest.update(json.dumps([str(key) for key in data_x.keys()] + [str(data_y.name)]).encode())
+
+    return digest.hexdigest()
+
+
+class FoldCache(object):
+    """Results (true and predicted labels) of cross-validation folds of scikit-learn estimators.
+
+    A fold is identified by the estimator class and parameters, the fold index (with the number of folds) and the data
+    fingerprint. The results are kept in memory and, if a directory is given, stored there (one .npz file per fold),
+    so that they can be reused by later runs."""
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._results = {}
+
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(estimator, fold, n_splits, fingerprint):
+        """Cache key of a fold of a (configured) estimator"""
+
+        params = sorted((name, repr(value)) for name, value in estimator.get_params(deep=False).items())
+        description = [type(estimator).__module__, type(estimator).__qualname__, params, fold, n_splits, fingerprint]
+
+        return hashlib.sha256(json.dumps(description).encode()).hexdigest()
+
+    def _fname(self, key):
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def get(self, key):
+        """Return the true and predicted labels of a fold or None if the fold is not in the cache"""
+
+        if key not in self._results and self.directory is not None and os.path.exists(self._fname(key)):
+            with np.load(self._fname(key)) as f:
+                self._results[key] = f['true'], f['pred']
+
+        return self._results.get(key)
+
+    def put(self, key, labels_true, labels_pred):
+        self._results[key] = np.asarray(labels_true), np.asarray(labels_pred)
+
+        if self.directory is not None:
+            tmp_fname = self._fname(key) + '.tmp'
+            with open(tmp_fname, 'wb') as f:
+                np.savez(f, true=self._results[key][0], pred=self._results[key][1])
+            os.replace(tmp_fname, self._fname(key))
+
+
+def _sklearn_fold(data, estimator, target, train_idx, test_idx):
+    data_x = data.drop(columns=target)
+    data_y = data[target]
+
+    pred = estimator.fit(data_x.iloc[train_idx], data_y.iloc[train_idx]).predict(data_x.iloc[test_idx])
+    return list(data_y.iloc[test_idx]), list(pred)
+
+
+def fold_results(estimators, n_splits, data_x, data_y, n_jobs=None, cache=None, mp_context=None):
+    """Cross-validate estimators on the same folds (shuffled K-fold, see aux_functions.kfold_splits); return the true
+    and predicted labels of each fold of each estimator.
+
+    Folds found in the cache are not fitted again; the others are fitted (all of them in a pool of n_jobs processes,
+    if given) and added to the cache."""
+
+    cache = cache if cache is not None else FoldCache()
+    fingerprint = data_fingerprint(data_x, data_y)
+    splits = list(kfold_splits(len(data_x), n_splits))
+
+    keys = [[cache.key(estimator, i, n_splits, fingerprint) for i in range(n_splits)] for estimator in estimators]
+    missing = [(e, i) for e, estimator_keys in enumerate(keys) for i, key in enumerate(estimator_keys)
+               if cache.get(key) is None]
+    logger.info("Cross-validation of %d estimators: %d of %d folds not in the cache", len(estimators), len(missing),
+                len(estimators) * n_splits)
+
+    if missing:
+        target = data_y.name if data_y.name not in data_x.keys() else '__target__'
+        data = data_x.assign(**{target: data_y})
+        tasks = [(estimators[e], target) + splits[i] for e, i in missing]
+
+        if n_jobs is not None:
+            results = run_parallel(data, _sklearn_fold, tasks, n_jobs, mp_context=mp_context)
+        else:
+            results = [_sklearn_fold(data, *task) for task in tasks]
+
+        for (e, i), (labels_true, labels_pred) in zip(missing, results):
+            cache.put(keys[e][i], labels_true, labels_pred)
+
+    return [[cache.get(key) for key in estimator_keys] for estimator_keys in keys]
+
+
+def cross_validate_sklearn(estimator, n_splits, data_x, data_y, n_jobs=None, cache=None, plot_roc=True,
+                           mp_context=None):
+    test_labels_true = []
+    test_labels_pred = []
+
+    for i, (true_i, pred_i) in enumerate(fold_results([estimator], n_splits, data_x, data_y, n_jobs=n_jobs,
+                                                      cache=cache, mp_context=mp_context)[0]):
+        logger.debug("Cross-validation round %d with %d test samples", i, len(true_i))
+        test_labels_true.extend(true_i.tolist())
+        test_labels_pred.extend(pred_i.tolist())
+
+    if plot_roc:
+        calculate_and_plot_roc(test_labels_true, test_labels_pred, title="ROC curves for wine data classification")
+    return calculate_metrics(test_labels_true, test_labels_pred)
+
+
+def make_grid_searcher(data_x, data_y, n_splits=10, n_jobs=None, cache_dir=None, plot_roc=True, mp_context=None):
+    """Return a function tuning a scikit-learn estimator over a parameter grid with cross-validation.
+
+    Every parameter combination is scored by the mean accuracy over the folds (as in GridSearchCV) and the fold
+    results of the best one are reported (as by cross_validate_sklearn). The grid search and the report use the same
+    folds and a shared fold cache, so the best configuration is not fitted again; with cache_dir, the cache is kept
+    on disk and repeated tuning runs only fit folds not seen before. If n_jobs is given, the folds of all parameter
+    combinations are fitted in a pool of that many processes. With plot_roc=False, the ROC curves of the best
+    configuration are not plotted (e.g. when tuning in a background thread)."""
+
+    cache = FoldCache(cache_dir)
+
+    def wrapper(estimator, params):
+        from sklearn.base import clone
+        from sklearn.model_selection import ParameterGrid
+
+        candidates = list(ParameterGrid(params))
+        estimators = [clone(estimator).set_params(**candidate) for candidate in candidates]
+        results = fold_results(estimators, n_splits, data_x, data_y, n_jobs=n_jobs, cache=cache,
+                               mp_context=mp_context)
+
+        scores = [np.mean([np.mean(true_i == pred_i) for true_i, pred_i in folds]) for folds in results]
+        best = int(np.argmax(scores))
+        logger.info("Best parameters: %s (mean accuracy: %.3g)", candidates[best], scores[best])
+
+        res_stats = cross_validate_sklearn(estimators[best], n_splits=n_splits, data_x=data_x, data_y=data_y,
+                                           cache=cache, plot_roc=plot_roc)
+        return candidates[best], res_stats
+    return wrapper
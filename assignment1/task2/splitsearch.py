@@ -0,0 +1,288 @@
+"""Vectorised split search for the decision tree (based on cumulative class counts)"""
+
+import numpy as np
+from math import inf
+
+import profiling
+
+
+def entropy_counts(counts):
+    """Calculate entropy for each row of class occurrences (last axis - classes); empty rows have zero entropy"""
+
+    counts = np.asarray(counts, dtype=float)
+    n = counts.sum(axis=-1, keepdims=True)
+
+    if profiling.enabled:
+        profiling.count('entropy_calls')
+        profiling.count('entropy_rows', n.size)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        probs = counts / n
+        terms = np.where(counts > 0, probs * np.log2(probs), 0.)
+
+    return - terms.sum(axis=-1)
+
+
+def split_gains(left_counts, total_counts, node_counts=None):
+    """Calculate information gains of binary splits.
+
+    As in Node.get_split_information_gain, the gain is the entropy of all the node samples minus the entropies of the
+    children weighted by their share of all the node samples - samples with a missing value do not go to any child.
+
+    Parameters
+    ----------
+    left_counts     :   np.ndarray
+        class occurrences on the left-hand side of each candidate split (shape: [..., n_candidates, n_classes])
+    total_counts    :   np.ndarray
+        class occurrences of the samples with a value of the attribute (shape: [..., n_classes])
+    node_counts     :   np.ndarray
+        class occurrences of all the node samples, including those with a missing value (default: total_counts)
+    """
+
+    if profiling.enabled:
+        profiling.count('split_gains', int(np.prod(np.shape(left_counts)[:-1])))
+
+    node_counts = np.asarray(total_counts if node_counts is None else node_counts)[..., np.newaxis, :]
+    total_counts = np.asarray(total_counts)[..., np.newaxis, :]
+    right_counts = total_counts - left_counts
+
+    n_node = node_counts.sum(axis=-1)
+    n_left = left_counts.sum(axis=-1)
+    n_right = total_counts.sum(axis=-1) - n_left
+
+    remainder = (n_left * entropy_counts(left_counts) + n_right * entropy_counts(right_counts)) / n_node
+
+    return entropy_counts(node_counts) - remainder
+
+
+def cumulative_class_counts(codes, n_classes):
+    """Running class occurrences along a sequence of class codes (row i - counts in codes[:i+1])"""
+
+    one_hot = np.zeros((len(codes), n_classes), dtype=np.int64)
+    one_hot[np.arange(len(codes)), codes] = 1
+
+    return np.cumsum(one_hot, axis=0)
+
+
+def best_threshold_split(values, codes, n_classes, n=1):
+    """Find the binary split of a continuous attribute with the highest information gain.
+
+    The values are sorted once; every mid-point between consecutive sorted values is a threshold candidate
+    (left-hand side: values <= threshold) and all candidates are scored in a single pass over cumulative class counts.
+
+    Parameters
+    ----------
+    values      :   np.ndarray
+        attribute values of the node samples
+    codes       :   np.ndarray
+        class codes (0, ..., n_classes-1) of the node samples
+    n_classes   :   int
+        number of class codes
+    n           :   int
+        granularity of the search (check every n-th threshold candidate)
+
+    Returns
+    -------
+    chosen gain and threshold (-inf and nan if there is no threshold candidate leaving both children non-empty)
+    """
+
+    values = np.asarray(values, dtype=float)
+    order = np.argsort(values, kind='stable')   # missing values at the end
+
+    return best_sorted_split(values[order], np.asarray(codes)[order], n_classes, n=n)
+
+
+def best_sorted_split(vals, codes, n_classes, n=1):
+    """Same as best_threshold_split, but for values already sorted in ascending order (missing values, if any, at
+    the end) with the corresponding class codes"""
+
+    vals, codes = np.asarray(vals, dtype=float), np.asarray(codes)
+    node_counts = np.bincount(codes, minlength=n_classes)
+    n_valid = len(vals) - np.count_nonzero(np.isnan(vals))
+    vals, codes = vals[:n_valid], codes[:n_valid]
+
+    th_cand = 0.5 * (vals[1:] + vals[:-1])  # threshold candidates - consecutive mid-points
+    th_cand = th_cand[::n]
+
+    # number of samples with value <= threshold (ties are always kept together); a candidate among the largest
+    # values would leave the right-hand child empty
+    n_left = np.searchsorted(vals, th_cand, side='right')
+    nonempty = n_left < n_valid
+    th_cand, n_left = th_cand[nonempty], n_left[nonempty]
+
+    if profiling.enabled:
+        profiling.count('candidate_thresholds', len(th_cand))
+
+    if not len(th_cand):
+        return -inf, np.nan
+
+    cum_counts = cumulative_class_counts(codes, n_classes)
+    gains = split_gains(cum_counts[n_left - 1], cum_counts[-1], node_counts)
+
+    idx = np.argmax(gains)
+
+    return float(gains[idx]), float(th_cand[idx])
+
+
+def quantile_edges(values, max_bins=255):
+    """Find bin edges for quantising an attribute into at most max_bins quantile bins.
+
+    Edges are mid-points between consecutive distinct values (the same candidates as in the exhaustive search), so an
+    attribute with at most max_bins distinct values is binned losslessly. Bin i holds values in (edges[i-1], edges[i]].
+    """
+
+    values = np.asarray(values, dtype=float)
+    uniq, counts = np.unique(values[~np.isnan(values)], return_counts=True)
+    edges = 0.5 * (uniq[1:] + uniq[:-1])
+
+    if len(edges) > max_bins - 1:
+        # fraction of samples at or below each edge; pick the edges closest to equally spaced quantiles
+        cum_frac = np.cumsum(counts)[:-1] / counts.sum()
+        targets = np.linspace(0, 1, max_bins + 1)[1:-1]
+        edges = edges[np.unique(np.minimum(np.searchsorted(cum_frac, targets), len(edges) - 1))]
+
+    return edges
+
+
+def quantise(values, edges, missing_bin):
+    """Convert attribute values to bin numbers (uint8); missing values go to a dedicated bin"""
+
+    values = np.asarray(values, dtype=float)
+    bins = np.searchsorted(edges, values, side='left').astype(np.uint8)
+    bins[np.isnan(values)] = missing_bin
+
+    return bins
+
+
+def best_histogram_split(histogram, edges):
+    """Find the binary split of a quantised attribute with the highest information gain.
+
+    Parameters
+    ----------
+    histogram   :   np.ndarray
+        class occurrences in each bin (shape: [n_bins, n_classes]; the last bin - missing values, not considered)
+    edges       :   np.ndarray
+        bin edges of the attribute (split after bin i is at threshold edges[i])
+
+    Returns
+    -------
+    chosen gain and threshold (-inf and nan if there is no valid threshold candidate)
+    """
+
+    cum_counts = np.cumsum(histogram[:-1], axis=0)
+    left_counts = cum_counts[:len(edges)]
+    total_counts = cum_counts[-1]
+
+    n_left = left_counts.sum(axis=1)
+    valid = (n_left > 0) & (n_left < total_counts.sum())  # no empty children
+
+    if profiling.enabled:
+        profiling.count('candidate_thresholds', np.count_nonzero(valid))
+
+    if not valid.any():
+        return -inf, np.nan
+
+    gains = np.where(valid, split_gains(left_counts, total_counts, histogram.sum(axis=0)), -inf)
+    idx = np.argmax(gains)
+
+    return float(gains[idx]), float(edges[idx])
+
+
+def optimal_partition(unit_counts, ways):
+    """Find the partition of a sequence of units (e.g. bins) into 'ways' consecutive segments with the lowest
+    remainder (sample-weighted sum of segment entropies) by dynamic programming over cumulative class counts.
+
+    Parameters
+    ----------
+    unit_counts :   np.ndarray
+        class occurrences in each unit (shape: [m, n_classes]); units should not be empty
+    ways        :   int
+        number of segments (at most m)
+
+    Returns
+    -------
+    the total remainder (not normalised) and the indices of units starting the 2nd, 3rd, ... segment
+    """
+
+    m = len(unit_counts)
+    prefix = np.concatenate([np.zeros((1, unit_counts.shape[1]), dtype=np.int64), np.cumsum(unit_counts, axis=0)])
+
+    # cost[i, j] - remainder of a segment made of units i, ..., j-1 (O(m^2) segments)
+    segments = prefix[np.newaxis, :, :] - prefix[:, np.newaxis, :]
+    cost = segments.sum(axis=-1) * entropy_counts(np.maximum(segments, 0))
+    cost[np.tril_indices(m + 1)] = inf
+
+    if profiling.enabled:
+        profiling.count('split_gains', m * (m + 1) // 2)
+
+    best = cost[0]  # best[j] - lowest remainder of units 0, ..., j-1 split into t segments
+    back_pointers = []
+    for _ in range(ways - 1):
+        candidates = best[:, np.newaxis] + cost
+        back_pointers.append(np.argmin(candidates, axis=0))
+        best = candidates.min(axis=0)
+
+    cuts = []
+    j = m
+    for pointers in reversed(back_pointers):
+        j = pointers[j]
+        cuts.append(int(j))
+
+    return best[m], cuts[::-1]
+
+
+def best_multiway_histogram_split(histogram, edges, ways):
+    """Find the optimal split of a quantised attribute into (at most) 'ways' value ranges.
+
+    Parameters
+    ----------
+    histogram   :   np.ndarray
+        class occurrences in each bin (shape: [n_bins, n_classes]; bins after len(edges) + 1, e.g. the bin of missing
+        values, are not split, but they count in the node entropy)
+    edges       :   np.ndarray
+        bin edges of the attribute (bin i holds values in (edges[i-1], edges[i]])
+    ways        :   int
+        maximal number of value ranges
+
+    Returns
+    -------
+    chosen gain and thresholds (-inf and an empty list if the attribute cannot be split)
+    """
+
+    node_counts = histogram.sum(axis=0)
+    histogram = histogram[:len(edges) + 1]
+    nonempty = np.flatnonzero(histogram.sum(axis=1))
+
+    if profiling.enabled:
+        profiling.count('candidate_thresholds', max(len(nonempty) - 1, 0))
+
+    if len(nonempty) < 2:
+        return -inf, []
+
+    remainder, cuts = optimal_partition(histogram[nonempty], min(ways, len(nonempty)))
+
+    # a segment starting at a non-empty bin is separated from the previous one at the upper edge of its bin
+    thresholds = [float(edges[nonempty[cut - 1]]) for cut in cuts]
+
+    return float(entropy_counts(node_counts) - remainder / node_counts.sum()), thresholds
+
+
+def best_multiway_split(values, codes, n_classes, ways, max_units=255):
+    """Find the optimal split of a continuous attribute into (at most) 'ways' value ranges.
+
+    Distinct values are grouped into at most max_units quantile units (see quantile_edges; no grouping if there are
+    fewer distinct values), then the optimal partition of the units is found by dynamic programming - O(ways * m^2)
+    for m units.
+
+    Returns
+    -------
+    chosen gain and thresholds (-inf and an empty list if the attribute cannot be split)
+    """
+
+    values = np.asarray(values, dtype=float)
+
+    edges = quantile_edges(values, max_bins=max_units)
+    units = np.where(np.isnan(values), len(edges) + 1, np.searchsorted(edges, values, side='left'))  # last: missing
+    histogram = np.bincount(units * n_classes + np.asarray(codes), minlength=(len(edges) + 2) * n_classes)
+
+    return best_multiway_histogram_split(histogram.reshape(len(edges) + 2, n_classes), edges, ways)
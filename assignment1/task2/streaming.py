@@ -0,0 +1,184 @@
+"""Out-of-core decision tree learning from a CSV file read in chunks"""
+
+import numpy as np
+import pandas as pd
+import logging
+
+from decisiontree import Node, TreeData
+from splitsearch import best_histogram_split, best_multiway_histogram_split, quantile_edges, quantise
+
+logger = logging.getLogger(__name__)
+
+
+def _read_chunks(fname, chunksize, read_csv_kwargs):
+    return pd.read_csv(fname, chunksize=chunksize, **read_csv_kwargs)
+
+
+def _scan(fname, target_column, chunksize, sample_size, read_csv_kwargs, seed=0):
+    """First pass over the data: find the schema and the class labels and draw a uniform random sample of rows
+    (for the bin edges)"""
+
+    rng = np.random.default_rng(seed)
+    schema = None
+    classes = np.array([], dtype=np.int64)
+    sample, sample_keys = None, np.array([])
+
+    for chunk in _read_chunks(fname, chunksize, read_csv_kwargs):
+        if schema is None:
+            schema = chunk.iloc[:0]
+
+        classes = np.union1d(classes, chunk.iloc[:, target_column].unique())
+
+        # keep the rows with the smallest random keys (a uniform sample without replacement)
+        keys = np.concatenate([sample_keys, rng.random(len(chunk))])
+        rows = chunk if sample is None else pd.concat([sample, chunk], ignore_index=True)
+        keep = np.argsort(keys, kind='stable')[:sample_size]
+        sample, sample_keys = rows.iloc[keep].reset_index(drop=True), keys[keep]
+
+    if schema is None:
+        raise ValueError(f"No data in file {fname}")
+
+    return schema, classes, sample
+
+
+def _route(node, chunk, rows, node_ids, frontier_ids):
+    """Find the frontier node for each row of a chunk (-1 for rows ending at terminal nodes or not routable)"""
+
+    if id(node) in frontier_ids:
+        node_ids[rows] = frontier_ids[id(node)]
+        return
+
+    if not node.children:
+        return
+
+    th = node.split_thresholds
+    which_child = np.searchsorted(th, chunk[node.split_attribute].to_numpy()[rows], side='left') - 1
+
+    for i, child in enumerate(node.children):
+        child_rows = rows[which_child == i]
+        if len(child_rows):
+            _route(child, chunk, child_rows, node_ids, frontier_ids)
+
+
+def _children_counts(histogram, edges, thresholds):
+    """Class occurrences of the children of a split at given thresholds (bin edges) from a node histogram"""
+
+    threshold_bins = np.searchsorted(edges, thresholds)
+    ranges = np.searchsorted(threshold_bins, np.arange(len(edges) + 1), side='left')
+
+    counts = np.zeros((len(thresholds) + 1, histogram.shape[-1]), dtype=np.int64)
+    np.add.at(counts, ranges, histogram[:len(edges) + 1])
+
+    return counts
+
+
+def learn_streaming(fname, max_depth=5, target_column=0, chunksize=100000, max_bins=255, sample_size=100000, ways=2,
+                    **read_csv_kwargs):
+    """Grow a decision tree from a CSV file without loading it into memory.
+
+    The attributes are quantised into quantile bins (edges found from a uniform random sample of rows). The tree is
+    grown level by level: for each level, one pass over the file builds per-node, per-attribute class histograms of
+    the nodes to be split, and the splits are chosen from the histograms (as in the histogram mode of Node.learn).
+    Memory use is bounded by (nodes in a level x attributes x bins x classes), not by the number of rows.
+
+    Parameters
+    ----------
+    fname           :   str
+        CSV file with the data (all attributes, including the target attribute)
+    max_depth       :   int
+        maximal depth of the tree
+    target_column   :   int
+        index of the class labels column
+    chunksize       :   int
+        number of rows read at once
+    max_bins        :   int
+        maximal number of bins per attribute
+    sample_size     :   int
+        number of rows used for finding the bin edges
+    ways            :   int
+        maximal number of children of a node
+    read_csv_kwargs :
+        passed to pandas.read_csv (e.g. 'names')
+
+    Returns
+    -------
+    the tree (a Node without samples in memory - it can be used for prediction, testing and pruning)
+    """
+
+    logger.info("Scanning file %s", fname)
+    schema, classes, sample = _scan(fname, target_column, chunksize, sample_size, read_csv_kwargs)
+
+    store = TreeData(schema, target_column=target_column, classes=classes)
+    attributes = store.input_attributes
+    edges = [quantile_edges(sample[attr].to_numpy(dtype=float), max_bins=max_bins) for attr in attributes]
+    n_attr, n_bins, n_cls = len(attributes), max_bins + 1, len(store.classes)
+    logger.info("Found %d classes; sampled %d rows for quantising %d attributes", n_cls, len(sample), n_attr)
+
+    tree = Node(store)
+    frontier = [tree]
+
+    for level in range(max_depth + 1):
+        if level == max_depth:
+            logger.info("Reached the maximal depth - terminating %d nodes", len(frontier))
+            for node in frontier:
+                node.terminate()
+            break
+
+        # one pass over the data: histograms of the frontier nodes
+        frontier_ids = {id(node): i for i, node in enumerate(frontier)}
+        histograms = np.zeros(len(frontier) * n_attr * n_bins * n_cls, dtype=np.int64)
+        logger.info("Level %d: building histograms of %d nodes", level, len(frontier))
+
+        for chunk in _read_chunks(fname, chunksize, read_csv_kwargs):
+            node_ids = np.full(len(chunk), -1)
+            _route(tree, chunk, np.arange(len(chunk)), node_ids, frontier_ids)
+
+            rows = np.flatnonzero(node_ids >= 0)
+            codes = np.searchsorted(store.classes, chunk[store.target_attribute].to_numpy()[rows])
+
+            bins = np.stack([quantise(chunk[attr].to_numpy(dtype=float)[rows], edges[i], missing_bin=max_bins)
+                             for i, attr in enumerate(attributes)])
+            flat = ((node_ids[rows] * n_attr + np.arange(n_attr)[:, np.newaxis]) * n_bins + bins) * n_cls + codes
+            histograms += np.bincount(flat.ravel(), minlength=len(histograms))
+
+        histograms = histograms.reshape(len(frontier), n_attr, n_bins, n_cls)
+
+        next_frontier = []
+        for node, histogram in zip(frontier, histograms):
+            if node is tree:
+                tree.set_label_counts(histogram[0].sum(axis=0))
+
+            if node.n_classes < 2:
+                node.terminate()
+                continue
+
+            if ways > 2:
+                results = [best_multiway_histogram_split(histogram[i], edges[i], ways) for i in range(n_attr)]
+            else:
+                results = [best_histogram_split(histogram[i], edges[i]) for i in range(n_attr)]
+                results = [(gain, [th]) for gain, th in results]
+
+            idx = int(np.argmax([gain for gain, _ in results]))
+            gain, thresholds = results[idx]
+            if gain == -np.inf:
+                node.terminate()
+                continue
+
+            logger.debug("Splitting node %s at attribute '%s' (expected gain: %.3g)", node.trace(), attributes[idx],
+                         gain)
+            node.split_from_counts(attributes[idx], thresholds, _children_counts(histogram[idx], edges[idx],
+                                                                                 thresholds))
+
+            # uniform children are known from the counts - no need to build their histograms
+            for child in node.children:
+                if child.n_classes < 2:
+                    child.terminate()
+                else:
+                    next_frontier.append(child)
+
+        if not next_frontier:
+            break
+
+        frontier = next_frontier
+
+    return tree
@@ -0,0 +1,108 @@
+"""Vectorised split search compared with the exhaustive search of the original implementation (data with missing
+values included); run with pytest"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+from math import inf
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from decisiontree import Node
+from splitsearch import best_threshold_split, best_multiway_split
+
+
+def reference_entropy(labels):
+    occurrences = np.array([labels.count(c) for c in set(labels)], dtype=float)
+    probs = occurrences / occurrences.sum()
+
+    return - (probs * np.log2(probs)).sum() if len(labels) else 0.
+
+
+def reference_gain(values: pd.Series, labels: pd.Series, thresholds):
+    """Information gain of a split as in the original Node.get_split_information_gain: samples with a missing value
+    fall into no value range, but count in the node entropy and the normalisation"""
+
+    th = sorted(list(thresholds) + [-inf, inf])
+    split_labels = [labels[(values > th[i - 1]) & (values <= th[i])].to_list() for i in range(1, len(th))]
+
+    remainder = sum(len(part) / len(values) * reference_entropy(part) for part in split_labels)
+
+    return reference_entropy(labels.to_list()) - remainder, min(len(part) for part in split_labels)
+
+
+def reference_split(values: pd.Series, labels: pd.Series, n=1):
+    """Best threshold found by scoring the mid-points of sorted values one by one (as the original
+    Node.choose_split_threshold; candidates leaving a child empty are skipped)"""
+
+    vals = np.sort(values.dropna().to_numpy())
+    best = (-inf, np.nan)
+
+    for th in (0.5 * (vals[1:] + vals[:-1]))[::n]:
+        gain, smallest = reference_gain(values, labels, [th])
+        if smallest and gain > best[0]:
+            best = (gain, th)
+
+    return best
+
+
+def random_frame(rng, n_samples, n_attributes=3, missing=0.2):
+    data = {'label': rng.integers(0, 3, n_samples)}
+    for i in range(n_attributes):
+        values = rng.integers(0, 8, n_samples).astype(float) if i % 2 else rng.normal(size=n_samples)
+        values[rng.random(n_samples) < missing] = np.nan
+        data[f'x{i}'] = values
+
+    return pd.DataFrame(data)
+
+
+@pytest.mark.parametrize('seed', range(20))
+@pytest.mark.parametrize('n', [1, 3])
+def test_threshold_split_matches_reference(seed, n):
+    df = random_frame(np.random.default_rng(seed), n_samples=40)
+    classes, codes = np.unique(df['label'], return_inverse=True)
+
+    for attribute in ['x0', 'x1', 'x2']:
+        gain, threshold = best_threshold_split(df[attribute].to_numpy(), codes, len(classes), n=n)
+        ref_gain, ref_threshold = reference_split(df[attribute], df['label'], n=n)
+
+        assert gain == pytest.approx(ref_gain, abs=1e-12)
+        assert threshold == ref_threshold or np.isnan(threshold) and np.isnan(ref_threshold)
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_chosen_split_matches_reference(seed):
+    df = random_frame(np.random.default_rng(seed), n_samples=200, n_attributes=5)
+    attributes = [key for key in df.keys() if key != 'label']
+    ref = [reference_split(df[attribute], df['label']) for attribute in attributes]
+
+    tree = Node(df)
+    attribute, thresholds = tree.choose_split_attribute()
+    ref_attribute = attributes[int(np.argmax([gain for gain, _ in ref]))]
+
+    assert attribute == ref_attribute
+    assert thresholds == [ref[attributes.index(attribute)][1]]
+    assert tree.get_split_information_gain(attribute, thresholds) == pytest.approx(
+        reference_gain(df[attribute], df['label'], thresholds)[0], abs=1e-12)
+
+    # histogram mode with lossless bins (fewer distinct values than bins) - the same partitions of the samples (the
+    # thresholds are the mid-points between distinct values)
+    tree = Node(df)
+    tree.quantise(max_bins=255)
+    hist_attribute, hist_thresholds = tree.choose_split_attribute()
+    assert hist_attribute == attribute
+    assert tree.get_split_information_gain(hist_attribute, hist_thresholds) == pytest.approx(
+        tree.get_split_information_gain(attribute, thresholds), abs=1e-12)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_multiway_split_gain_matches_reference(seed):
+    df = random_frame(np.random.default_rng(seed), n_samples=60)
+    classes, codes = np.unique(df['label'], return_inverse=True)
+
+    for attribute in ['x0', 'x1', 'x2']:
+        gain, thresholds = best_multiway_split(df[attribute].to_numpy(), codes, len(classes), ways=3)
+
+        assert gain == pytest.approx(reference_gain(df[attribute], df['label'], thresholds)[0], abs=1e-12)
@@ -1,70 +1,131 @@
 import configparser
-import numpy as np
-import pandas as pd
+import copy
 import logging
-import coloredlogs
-
-from sklearn.ensemble import RandomForestClassifier
-from sklearn.neural_network import MLPClassifier
+import multiprocessing
+import os
+import sys
 
 import aux_functions as aux
+import sklearn_comparison as skc
 from decisiontree import Node
+from pipeline import Pipeline, frame_fingerprint
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import datacache
 
 
 # read the configuration file
 config = configparser.ConfigParser()
 config.read("config.ini")
 
-# configure logger
 logger = logging.getLogger(__name__)
-coloredlogs.install(level=config['Logging']['level'], logger=logger.parent)
-
-# load dataset
-# a) load data headers, strip 3 initial characters (row number + closing bracket + optional whitespace)
-data_headers_fname = config['Data']['data_headers']
-logger.debug(f"Loading data headers from file: {data_headers_fname}")
-headers = np.loadtxt(data_headers_fname, dtype=str, delimiter='\n', converters={0: lambda attr: attr[3:]})
-logger.debug(f"Data headers: {headers}")
-
-# b) load the data
-data_fname = config['Data']['data_file']
-logger.info(f"Loading data from file: {data_fname}")
-df_input = pd.read_csv(data_fname, names=headers)
-
-# Define exemplary tree
-tree = Node(df_input, target_column=int(config['Data']['target_column']))
-tree.learn(max_depth=5)
-tree.prune(min_points=2)
-
-# perform classification using DT
+
 N_SPLITS = 10
-tree_params = dict(max_depth=range(3, 10), min_points=range(1, 5))
+N_JOBS = config.getint('Tuning', 'n_jobs')
+# the pipeline runs stages in threads, and forking a multi-threaded process may deadlock: the process pools of the
+# stages start their workers from a fork server. The fork server imports this module, so the run (with the logger
+# configuration and the scikit-learn estimators) is under __main__ and the tree workers do not load scikit-learn
+MP_CONTEXT = multiprocessing.get_context('forkserver')
+
+
+# pipeline stages (each one is called with the results of the stages it depends on)
+def load_data():
+    # data headers: 3 initial characters are stripped - row number + closing bracket + optional whitespace;
+    # the parsed data is kept in a binary columnar cache, see datacache
+    logger.info("Loading data from file: %s", config['Data']['data_file'])
+    df_input = datacache.load_dataset(config['Data'])
+    logger.debug("Data headers: %s", list(df_input.keys()))
+    return df_input
+
 
-# all_results, best_result = aux.tune_params(aux.cross_validate_tree, tree_params, func_args=(N_SPLITS, df_input),
-#                                            scoring_metrics='f1_score')
-# print(all_results)
-# print("Best result: ", best_result)
+def split_data(df_input):
+    """Input attributes and class labels"""
 
+    target = df_input.keys()[int(config['Data']['target_column'])]
+    return df_input.drop(columns=target), df_input[target]
 
-df_y = tree.class_labels
-df_x = tree.data[tree.input_attributes]
 
-gs = aux.make_grid_searcher(df_x, df_y, N_SPLITS)
+def train_tree(df_input, max_depth):
+    tree = Node(df_input, target_column=int(config['Data']['target_column']))
+    tree.learn(max_depth=max_depth)
+    return tree
 
-# Random forest
-logger.info("Tuning random forest classifier")
-rf = RandomForestClassifier(n_estimators=100, criterion='entropy')
-rf_params = dict(max_depth=range(3, 10), min_samples_leaf=range(1,5))
-print(gs(rf, rf_params))
 
-# shallow NN
-logger.info("Tuning shallow NN classifier")
-snn = MLPClassifier()
-snn_params = dict(hidden_layer_sizes=[(100,), (200,), (500,)], alpha=[0.001, 0.0001, 0.00001])
-print(gs(snn, snn_params))
+def prune_tree(tree, min_points):
+    tree = copy.deepcopy(tree)    # the trained tree may be used by other stages
+    tree.prune(min_points=min_points)
+    return tree
+
+
+def cross_validate_tree(df_input, n_splits, **kwargs):
+    return aux.cross_validate_tree(n_splits, df_input, n_jobs=N_JOBS, plot_roc=False, mp_context=MP_CONTEXT,
+                                   target_column=int(config['Data']['target_column']), **kwargs)
+
+
+def tune_estimator(df_input, estimator, params, n_splits):
+    df_x, df_y = split_data(df_input)
+    gs = skc.make_grid_searcher(df_x, df_y, n_splits, n_jobs=N_JOBS, cache_dir=config['Tuning']['fold_cache'],
+                                plot_roc=False, mp_context=MP_CONTEXT)
+    return gs(estimator, params)
+
+
+example_tree_params = dict(max_depth=5, min_points=2)
+tree_params = dict(max_depth=range(3, 10), min_points=range(1, 5))
 
-# deep NN
-logger.info("Tuning deep NN classifier")
-dnn = MLPClassifier()
-dnn_params = dict(hidden_layer_sizes=[100*(10,), 50*(20,), 20*(50,)], alpha=[0.001, 0.0001, 0.00001])
-print(gs(dnn, dnn_params))
+if __name__ == '__main__':
+    import coloredlogs
+    from sklearn.base import clone
+    from sklearn.ensemble import RandomForestClassifier
+    from sklearn.neural_network import MLPClassifier
+
+    # configure logger
+    coloredlogs.install(level=config['Logging']['level'], logger=logger.parent)
+
+    estimators = {
+        # Random forest
+        'random_forest': (RandomForestClassifier(n_estimators=100, criterion='entropy'),
+                          dict(max_depth=range(3, 10), min_samples_leaf=range(1, 5))),
+        # shallow NN
+        'shallow_nn': (MLPClassifier(),
+                       dict(hidden_layer_sizes=[(100,), (200,), (500,)], alpha=[0.001, 0.0001, 0.00001])),
+        # deep NN
+        'deep_nn': (MLPClassifier(),
+                    dict(hidden_layer_sizes=[100*(10,), 50*(20,), 20*(50,)], alpha=[0.001, 0.0001, 0.00001])),
+    }
+
+    # the stages are keyed by the configuration values and parameters (the number of folds included) they use;
+    # results of earlier runs are reused from the pipeline cache and the independent stages (tree and the estimator
+    # grids) run concurrently
+    pipeline = Pipeline(config, cache_dir=config['Pipeline']['cache_directory'],
+                        n_jobs=config.getint('Pipeline', 'n_jobs', fallback=None))
+    pipeline.add('load', load_data, config_keys=('Data',), cache=False, fingerprint=frame_fingerprint)
+    pipeline.add('train_tree', train_tree, deps=('load',), params=dict(max_depth=example_tree_params['max_depth']),
+                 config_keys=(('Data', 'target_column'),))
+    pipeline.add('prune_tree', prune_tree, deps=('train_tree',),
+                 params=dict(min_points=example_tree_params['min_points']))
+    pipeline.add('cross_validate_tree', cross_validate_tree, deps=('load',),
+                 params=dict(n_splits=N_SPLITS, **example_tree_params), config_keys=(('Data', 'target_column'),))
+    for name, (estimator, params) in estimators.items():
+        pipeline.add(f'tune_{name}', tune_estimator, deps=('load',),
+                     params=dict(estimator=estimator, params=params, n_splits=N_SPLITS),
+                     config_keys=(('Data', 'target_column'),))
+
+    results = pipeline.run()
+    df_input = results['load']
+
+    # perform classification using DT
+    print(results['cross_validate_tree'])
+
+    # all_results, best_result = aux.tune_params(aux.cross_validate_tree, tree_params, func_args=(N_SPLITS, df_input),
+    #                                            scoring_metrics='f1_score')
+    # print(all_results)
+    # print("Best result: ", best_result)
+
+    # tuned estimators (the ROC curves of the best configurations are plotted from the fold cache)
+    df_x, df_y = split_data(df_input)
+    for name, (estimator, params) in estimators.items():
+        logger.info("Tuned %s classifier", name.replace('_', ' '))
+        best_params, res_stats = results[f'tune_{name}']
+        print(best_params, res_stats)
+        skc.cross_validate_sklearn(clone(estimator).set_params(**best_params), N_SPLITS, df_x, df_y,
+                                   cache=skc.FoldCache(config['Tuning']['fold_cache']))